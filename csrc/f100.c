@@ -19,7 +19,8 @@ static cpu_t    cpu;
 
 // CPU Functions
 cpu_t *f100_init( bool trace_on, bool memtrace_on, bool regtrace_on) {
-  cpu.mem = (uint16_t *) malloc(F100MEMSZ * sizeof(uint16_t));
+  // May be called again to change the trace options, keeping the same memory
+  if (cpu.mem == NULL) cpu.mem = (uint16_t *) calloc(F100MEMSZ, sizeof(uint16_t));
   cpu.stats.mwrites = 0;
   cpu.stats.mreads = 0;
   cpu.stats.instrs = 0;
@@ -321,7 +322,8 @@ int32_t f100_exec(int max_instr ){
    default: break;
     }
   }
-  cpu.stats.instrs += i+1;
-  if (HALT(cpu.ir)) printf("CPU Halted with halt number 0x%04X\n", cpu.ir.WORD & 0x03FF);
-  return (i+1);
+  // The HALT instruction is counted, but the loop exit on max_instr is not
+  if (HALT(cpu.ir)) i++;
+  cpu.stats.instrs += i;
+  return (i);
 }
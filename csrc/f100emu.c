@@ -124,6 +124,7 @@ int main (int argc, char **argv ) {
   int time_now_ms = clock() * 1000 / CLOCKS_PER_SEC;    
   int instr_count = f100_exec(0);
   time_now_ms = (clock() * 1000 / CLOCKS_PER_SEC) - time_now_ms;
+  if (HALT(f100_cpu->ir)) printf("CPU Halted with halt number 0x%04X\n", f100_cpu->ir.WORD & 0x03FF);
   printf ("# -------------------------------------------------------------------------------------------\n");
   printf ("# Program Execution Statistics\n");
   printf ("# -------------------------------------------------------------------------------------------\n");
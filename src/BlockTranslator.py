@@ -0,0 +1,204 @@
+## ============================================================================
+## BlockTranslator.py - Basic block translation for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Basic Block Translation
+-----------------------
+
+A basic block is a straight line run of instructions starting at a given address
+and ending just before the first jump, call, return, halt or other instruction which
+cannot be translated. Each block is turned into the source of a single Python function
+which is compiled once and then cached by the CPU against its start address.
+
+Within a block the accumulator, operand register and condition flags are held in
+local variables, immediate and immediate indirect operands are folded into constants
+and the PC, memory access, instruction and cycle counts are only written back when the
+block exits. The terminating instruction is always left to the normal decode and execute
+path.
+
+Every memory write from a block is checked against the CPU code map so that self
+modifying code invalidates any affected blocks. A block which writes over translated
+code stops immediately after the instruction making the write so that execution
+continues with the modified code.
+
+With a memory map (see F100MemoryMap) blocks are only made from code in RAM or ROM and
+stop before any instruction with a fixed operand address outside RAM. Instructions
+using a pointer check the page of the effective address and leave the block before
+making any access outside RAM, so that it is made by single stepping instead.
+
+A memory range error part way through a block is accounted for as single_step() would
+for the faulting instruction: it is counted as executed, the PC is left after its last
+word and the memory accesses made before the failing one are counted, so the state
+reported at an abnormal stop is the same with or without blocks.
+
+Blocks are short, as F100-L code branches often, and the instruction ending each one
+is still single stepped, so the gain depends on how long the straight line runs in a
+program are. Single stepping remains the default and the mode that supports tracing
+and memory observers.
+'''
+
+from InstructionReg import DECODE_TABLE
+from F100MemoryMap import PAGE_SHIFT, ROM
+
+class BlockTranslator:
+
+    ## Cap on the number of instructions in a single block
+    MAX_BLOCK_LENGTH = 64
+
+    def __init__ (self, CPU):
+        self.CPU = CPU
+        ## Blocks must not wrap around the top of memory or the 15 bit PC
+        self.limit = min(CPU.MEMTOP, 0x7FFF)
+        ## Source lines to copy the local flag variables to/from the condition register
+        self.store_flags = "CR.fromint((CR.toint() & 0x41) | (M << 5) | (C << 4) | (S << 3) | (V << 2) | (Z << 1))"
+        self.load_flags = "f = CR.toint(); M = (f >> 5) & 1; C = (f >> 4) & 1; S = (f >> 3) & 1; V = (f >> 2) & 1; Z = (f >> 1) & 1"
+        self.namespace = dict()
+        self.names = dict()
+
+    def ref(self, obj):
+        '''
+        Return the name by which obj can be referenced from inside a translated block
+        '''
+        key = id(obj)
+        if key not in self.names:
+            name = "X%d" % len(self.names)
+            self.names[key] = name
+            self.namespace[name] = obj
+        return self.names[key]
+
+    def mapped(self, IR, pc, words):
+        '''
+        Return True if the instruction IR at pc, which is words long, is outside RAM and
+        ROM or has a fixed operand address outside RAM in the CPU memory map
+        '''
+        pages = self.CPU.page_table
+        RAM = self.CPU.RAM
+        page = pages[pc >> PAGE_SHIFT]
+        if page is not None and not isinstance(page, ROM):
+            return True
+        if IR.F != 0:
+            if IR.I == 0:
+                addresses = [ IR.N ] if IR.N != 0 else []
+            else:
+                addresses = [ IR.P if IR.P != 0 else RAM[pc + 1] ]
+        else:
+            ## Either the address of a memory operand or a jump destination
+            addresses = [ RAM[pc + 1] ] if words == 2 else []
+        return any(pages[a >> PAGE_SHIFT] is not None for a in addresses)
+
+    def pointer_guard(self):
+        '''
+        Return source lines leaving the block before the current instruction if the
+        effective address ea is not in RAM, or none if there is no memory map
+        '''
+        if self.CPU.page_table is None:
+            return []
+        return [ "if pages[(ea & 0xFFFF) >> %d] is not None: return" % PAGE_SHIFT ]
+
+    def count(self, IR, shift=False):
+        '''
+        Return a source line incrementing the CPU execution count for instruction IR, or
+        a null statement when statistics are disabled. Shift counts are also indexed by the
+        M flag.
+        '''
+        counts = self.CPU.exec_counts
+        if counts == None:
+            return "pass"
+        elif shift:
+            return "%s[0x%04X | (M << 16)] += 1" % (self.ref(counts), IR.content)
+        return "%s[0x%04X] += 1" % (self.ref(counts), IR.content)
+
+    def translate(self, start):
+        '''
+        Translate the block starting at address start, returning a tuple of the compiled
+        block function and the address of the last word it covers, or None if not even the
+        first instruction can be translated
+        '''
+        CPU = self.CPU
+        body = []
+        pcs = [start]
+        reads = [0]
+        writes = [0]
+        cycles = [0]
+        pc = start
+        while pc <= self.limit and len(pcs) <= self.MAX_BLOCK_LENGTH:
+            IR = DECODE_TABLE[CPU.RAM[pc]]
+            if IR.F not in CPU.opcode_table:
+                break
+            code = CPU.opcode_table[IR.F].translate(IR, pc, self)
+            if code == None:
+                break
+            (lines, words, nreads, nwrites) = code
+            if CPU.page_table is not None and self.mapped(IR, pc, words):
+                break
+            body.append("    # %04X : %04X" % (pc, IR.content))
+            if CPU.profiler != None:
+                body.append("    %s[0x%04X] += 1" % (self.ref(CPU.profiler.counts), pc))
+            body.extend("    %s" % l for l in lines)
+            body.append("    k = %d" % len(pcs))
+            if nwrites > 0:
+                body.append("    if smc: return")
+            pc += words
+            pcs.append(pc & 0x7FFF)
+            reads.append(reads[-1] + nreads)
+            writes.append(writes[-1] + nwrites)
+            cycles.append(cycles[-1] + CPU.timing.cycles(IR.content))
+
+        if len(pcs) == 1:
+            return None
+
+        source = [ "def block(cpu):",
+                   "  RAM = cpu.RAM",
+                   "  CR = cpu.CR",
+                   "  ws = cpu.RAM_writeset.add",
+                   "  cm = cpu.code_map",
+                   "  inval = cpu.invalidate_code",
+                   "  pages = cpu.page_table",
+                   "  ACC = cpu.ACC",
+                   "  OR = cpu.OR",
+                   "  " + self.load_flags,
+                   "  smc = False",
+                   "  dc = 0",
+                   "  k = 0",
+                   "  fault = 0",
+                   "  x = None",
+                   "  try:" ]
+        source.extend(body)
+        source.extend([ "  except UserWarning:",
+                        "    fault = 1",
+                        "    if x == None:",
+                        "      x = (%r[k + 1] - %r[k], %r[k + 1] - %r[k])" % (tuple(reads), tuple(reads), tuple(writes), tuple(writes)),
+                        "    cpu.read_count += x[0]",
+                        "    cpu.write_count += x[1]",
+                        "    raise",
+                        "  finally:",
+                        "    cpu.ACC = ACC",
+                        "    cpu.OR = OR",
+                        "    " + self.store_flags,
+                        "    cpu.PC = %r[k + fault]" % (tuple(pcs),),
+                        "    cpu.read_count += %r[k]" % (tuple(reads),),
+                        "    cpu.write_count += %r[k]" % (tuple(writes),),
+                        "    cpu.instr_count += k + fault",
+                        "    cpu.cycle_count += %r[k] + dc" % (tuple(cycles),) ])
+        namespace = dict(self.namespace)
+        exec(compile("\n".join(source), "<block 0x%04X>" % start, "exec"), namespace)
+        return (namespace["block"], pc - 1)
@@ -25,10 +25,69 @@ The Condition Register hold 7 flag bits.
 
 The 'M' flag is cleared by a CPU reset, interrupt or execution of the CAL (Call subroutine) instruction.
 It can also be cleared or set explicitly by the user through one of the bit set or clear, rotate or shift instructions.
+
+Implementation
+--------------
+
+The register is held as a single packed integer using the bit positions above, so
+toint() and fromint() are simple reads and writes of that value. The individual flags
+are properties which extract or insert their own bit, and UNPACK is a precomputed
+table of the (F, M, C, S, V, Z, I) flag tuple for every register value. Instructions
+which set several flags at once do so through the set_*_flags() methods, which update
+the packed value in one step.
 '''
 
+## Bit positions of each flag in the packed register value
+FLAG_BITS = { "I":0, "Z":1, "V":2, "S":3, "C":4, "M":5, "F":6 }
+
+## Mask of the flags set by the arithmetic instructions
+ARITH_FLAGS = 0x1E
+
+## Table of (F, M, C, S, V, Z, I) flag tuples indexed by register value
+UNPACK = tuple( tuple( (v >> b) & 1 for b in (6, 5, 4, 3, 2, 1, 0)) for v in range(128))
+
+def add_flags(acc, operand, result):
+    '''
+    Return the packed C, S, V and Z flags for an addition of acc and operand giving result
+    '''
+    return ( ((result >> 12) & 0x10) |
+             ((result >> 12) & 0x08) |
+             (0x04 if not ((acc ^ operand) & 0x8000) and ((result ^ acc) & 0x8000) else 0) |
+             (0 if result & 0xFFFF else 0x02) )
+
+def sub_flags(acc, operand, result):
+    '''
+    Return the packed C, S, V and Z flags for a subtraction of acc from operand giving result
+    '''
+    return ( (((result >> 12) & 0x10) ^ 0x10) |
+             ((result >> 12) & 0x08) |
+             (0x04 if ((acc ^ operand) & 0x8000) and ((result ^ operand) & 0x8000) else 0) |
+             (0 if result & 0xFFFF else 0x02) )
+
+def flag_property(bit):
+    '''
+    Return a property accessing a single bit of the packed register value
+    '''
+    mask = 1 << bit
+    clear = 0x7F ^ mask
+    def get(self):
+        return (self.value >> bit) & 1
+    def set(self, val):
+        self.value = (self.value | mask) if val & 1 else (self.value & clear)
+    return property(get, set)
+
 class ConditionReg:
 
+    __slots__ = ( "value", )
+
+    I = flag_property(FLAG_BITS["I"])
+    Z = flag_property(FLAG_BITS["Z"])
+    V = flag_property(FLAG_BITS["V"])
+    S = flag_property(FLAG_BITS["S"])
+    C = flag_property(FLAG_BITS["C"])
+    M = flag_property(FLAG_BITS["M"])
+    F = flag_property(FLAG_BITS["F"])
+
     def __init__ (self):
         self.reset()
 
@@ -38,35 +97,56 @@ class ConditionReg:
         the actual silicon only the I, M and F bits are reset to 0. The other bits are
         left undefined.
         '''
-        self.V = 0
-        self.Z = 0
-        self.S = 0
-        self.C = 0
-        self.I = 0
-        self.M = 0
-        self.F = 0
+        self.value = 0
 
     def fromint(self, val):
         '''
         Unpack an integer value into the individual flag components
         '''
-        self.I = (val >> 0) & 0x01
-        self.Z = (val >> 1) & 0x01
-        self.V = (val >> 2) & 0x01
-        self.S = (val >> 3) & 0x01
-        self.C = (val >> 4) & 0x01
-        self.M = (val >> 5) & 0x01
-        self.F = (val >> 6) & 0x01
+        self.value = val & 0x7F
 
     def toint(self) :
-        result = 0
-        for f in [ self.F, self.M, self.C, self.S, self.V, self.Z, self.I ]:
-            result = ( result << 1) | (f & 0x01)
-        return result
+        return self.value
+
+    def set_add_flags(self, acc, operand, result):
+        '''
+        Set C, S, V and Z for an addition of acc and operand giving result
+        '''
+        self.value = (self.value & ~ARITH_FLAGS) | add_flags(acc, operand, result)
+
+    def set_sub_flags(self, acc, operand, result):
+        '''
+        Set C, S, V and Z for a subtraction of acc from operand giving result
+        '''
+        self.value = (self.value & ~ARITH_FLAGS) | sub_flags(acc, operand, result)
+
+    def set_load_flags(self, data):
+        '''
+        Set S and Z from 16 bit data and clear V, leaving C unchanged
+        '''
+        self.value = (self.value & 0x71) | ((data >> 12) & 0x08) | (0 if data & 0xFFFF else 0x02)
+
+    def set_logic_flags(self, data, carry):
+        '''
+        Set S and Z from 16 bit data and C from carry, leaving V unchanged
+        '''
+        self.value = (self.value & 0x65) | ((carry & 1) << 4) | ((data >> 12) & 0x08) | (0 if data & 0xFFFF else 0x02)
+
+    def set_shift_flags(self, result, operand):
+        '''
+        Set S from a 16 bit shift result and V if its sign differs from that of
+        operand, leaving C and Z unchanged
+        '''
+        self.value = (self.value & 0x73) | ((result >> 12) & 0x08) | (((result ^ operand) >> 13) & 0x04)
+
+    def unpack(self):
+        '''
+        Return the flags as an (F, M, C, S, V, Z, I) tuple
+        '''
+        return UNPACK[self.toint()]
 
     def tostring(self):
         list = ["CR:  0x%04x   " % self.toint()]
-        for m in [attr for attr in dir(self) ]:
-            if not callable(getattr(self,m)) and  not m.startswith("__"):
-                list.append( "%s=%d, " % (m, getattr(self,m)))
+        for m in [ "C", "F", "I", "M", "S", "V", "Z" ]:
+            list.append( "%s=%d, " % (m, getattr(self,m)))
         return ''.join(list)
@@ -50,6 +50,9 @@ OPTIONAL SWITCHES ::
 
   -f --fullsymbols                    include all symbols in the symbol table output
 
+  -y --symbolfile <filename>          write all labels and .EQU values to a symbol
+                                      file for the emulator profilers (see F100Symbols)
+
   -h --help                           print this help message
 
   If no output filename is provided the assembler just produces the normal
@@ -62,6 +65,7 @@ EXAMPLES ::
 '''
 
 from SymbolTable import SymbolTable
+from F100Symbols import write_symbol_file, LABEL, EQU
 from F100_Opcodes.F100_Opcode import *
 from F100_Opcodes.OpcodeF15 import *
 from F100_Opcodes.OpcodeF13 import *
@@ -169,6 +173,7 @@ class F100Asm():
 
     def __init__(self):
         self.st = SymbolTable()
+        self.labels = dict()
         self.pc = 0
         self.opcodes = [ o() for o in (OpcodeF0_Jump, OpcodeF0_Shift, OpcodeF0_Halt, OpcodeF0_Bit,
                                        OpcodeF1, OpcodeF2, OpcodeF3, OpcodeF4, OpcodeF5,
@@ -285,6 +290,7 @@ class F100Asm():
             lineno +=1
             if pass_number > 0 :
                 assembled_words[line_pc] = line_words
+        self.labels = label_list
 
 
         if pass_number > 0:
@@ -333,6 +339,20 @@ class F100Asm():
 
         return(new_pc, words)
 
+    def symbols(self):
+        '''
+        Return a list of (name, value, kind) for every symbol which can be evaluated,
+        where kind is LABEL or EQU
+        '''
+        result = []
+        for name in self.st:
+            try:
+                value = self.st.eval_expr(name)
+            except (ValueError, TypeError, SyntaxError, RuntimeError):
+                continue
+            if isinstance(value, int):
+                result.append((name, value, LABEL if name in self.labels else EQU))
+        return result
 
 
 if __name__ == "__main__":
@@ -346,8 +366,9 @@ if __name__ == "__main__":
     listingon = True
     labelsonly = True
     symboltable = False
+    symbol_filename = ""
     try:
-        opts, args = getopt.getopt( sys.argv[1:], "e:f:o:g:hnlas", ["endianness=", "filename=","output=","format=","help","nolisting", "labelsonly", "allsymbols", "symboltable"])
+        opts, args = getopt.getopt( sys.argv[1:], "e:f:o:g:hnlasy:", ["endianness=", "filename=","output=","format=","help","nolisting", "labelsonly", "allsymbols", "symboltable", "symbolfile="])
     except getopt.GetoptError as  err:
         print(err)
         usage()
@@ -372,6 +393,8 @@ if __name__ == "__main__":
         if opt in ("-a", "--allsymbols"):
             labelsonly = False
             symboltable = True            
+        if opt in ("-y", "--symbolfile"):
+            symbol_filename = arg
         if opt in ("-s", "--symboltable"):
             symboltable = True
         elif opt in ("-h", "--help" ) :
@@ -387,6 +410,8 @@ if __name__ == "__main__":
             assembled_words = asm.twopass_assemble(text,listingon, symboltable, labelsonly)
             if output_filename != "" :
                 write_file(output_filename, output_format, assembled_words, endianness=endianness)
+            if symbol_filename != "" :
+                write_symbol_file(symbol_filename, asm.symbols())
         except UserWarning as e:
             print( e)
         e = time.time()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+## ============================================================================
+## F100Batch.py - Run many programs on the F100-L emulator in parallel
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+USAGE:
+
+  F100Batch runs a number of assembled programs on the F100-L emulator, spread over
+  a pool of worker processes, and prints a one line summary of each run.
+
+  python3 F100Batch.py [switches] <file> [<file> ...]
+
+OPTIONAL SWITCHES ::
+
+  -g --format    <bin|ihex|hex>  set the file format for all of the files
+                                 - by default taken from each file extension,
+                                   .hex, .bin or .ihex/.ihx
+
+  -a --adsel      <0|1>          specify the state of the AdSel pin
+                                 - defaults to 1 if not specified
+
+  -b --blocks                    translate and cache straight line blocks of code
+
+  -c --native                    run on the C core if it has been built
+
+  -e --endianness <little|big>   set endianness of byte oriented input files
+                                 - default is little-endian
+
+  -i --maxinstr   <int>          stop each program after this many instructions
+
+  -t --timeout    <seconds>      stop each program after this much wall clock time,
+                                 reported as TIMEOUT
+
+  -j --jobs       <int>          number of worker processes
+                                 - defaults to the number of CPUs
+
+  -m --memorydump                write each program's memory to <file>.pdump,
+                                 as F100Emu -d does
+
+  -s --statistics                gather per-instruction execution counts
+
+  -h --help                      print this help message
+
+EXAMPLES ::
+
+  python3 F100Batch.py -j 4 asm/*.hex
+
+From Python, run_batch() takes a list of programs, each either a filename, a
+(filename, format) pair or a sequence of 16 bit words loaded from address 0, and
+returns a list of BatchResult records in the same order ::
+
+  results = run_batch(["mul16.hex", "mul32.hex"], blocks=True,
+                      memory_ranges=[(0x0100, 0x010F)])
+
+'''
+
+from F100Emu import F100Emu, hex16dump
+from F100Loader import load_words
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import getopt
+import os.path
+import sys
+import time
+
+## Result of running one program. reason is as returned by F100CPU.run() or "ERROR"
+## if the program could not be loaded or run, in which case error holds the message.
+## After an error in the run the counts and memory are as the run left them, and
+## after a failure to load they are zero and empty.
+## memory maps each requested (lo, hi) range to a list of the words in it, and
+## execstats maps each opcode F field to the execution counts of its mnemonics (empty
+## unless statistics were gathered).
+BatchResult = namedtuple("BatchResult", "program reason halt_number error instr_count cycle_count "
+                         "read_count write_count memory execstats run_time")
+
+FORMATS = { ".hex":"hex", ".bin":"bin", ".ihex":"ihex", ".ihx":"ihex" }
+
+def file_format(filename):
+    '''
+    Return the file format implied by the extension of filename
+    '''
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in FORMATS:
+        raise UserWarning("Cannot tell the format of file %s" % filename)
+    return FORMATS[ext]
+
+def error_message(e):
+    '''
+    Return the message for an exception raised loading or running a program. Any
+    failure is recorded against that program alone so that the rest of the batch still
+    runs, naming the exception where it is not a reported error.
+    '''
+    return str(e) if isinstance(e, (UserWarning, OSError)) else "%s: %s" % (type(e).__name__, e)
+
+def run_program(program, adsel=1, statistics=False, blocks=False,
+                max_instructions=None, max_cycles=None, timeout=None, endianness="little",
+                memory_ranges=(), memorydump=False, backend="python"):
+    '''
+    Load and run a single program, returning a BatchResult
+    '''
+    name = program if isinstance(program, str) else program[0] if isinstance(program, tuple) else "<image>"
+    emu = F100Emu(adsel=adsel, statistics=statistics, backend=backend)
+    CPU = emu.CPU
+    try:
+        if isinstance(program, str):
+            emu.load_memory(program, file_format(program), endianness)
+        elif isinstance(program, tuple):
+            emu.load_memory(program[0], program[1], endianness)
+        else:
+            load_words(CPU, program)
+        CPU.reset()
+    except Exception as e:
+        return BatchResult(name, "ERROR", None, error_message(e), 0, 0, 0, 0, dict(), dict(), 0.0)
+    error = None
+    start = time.perf_counter()
+    try:
+        (reason, run_time) = emu.run(blocks, max_instructions, max_cycles, timeout)
+    except Exception as e:
+        ## Report the state the run stopped in, as F100Emu does after an error
+        (reason, error, run_time) = ("ERROR", error_message(e), time.perf_counter() - start)
+
+    if memorydump and name != "<image>":
+        hex16dump(CPU.RAM, 32768, os.path.splitext(name)[0] + ".pdump")
+    memory = dict()
+    for (lo, hi) in memory_ranges:
+        memory[(lo, hi)] = CPU.RAM[lo:hi+1].tolist()
+    execstats = dict()
+    if statistics:
+        CPU.collect_execstats()
+        for F in CPU.opcode_table:
+            execstats[F] = dict(CPU.opcode_table[F].execstats)
+    return BatchResult(name, reason, CPU.halt_number, error, CPU.instr_count, CPU.cycle_count,
+                       CPU.read_count, CPU.write_count, memory, execstats, run_time)
+
+def _run_job(job):
+    (program, options) = job
+    return run_program(program, **options)
+
+def run_batch(programs, processes=None, **options):
+    '''
+    Run each of programs with the run_program() keyword options across a pool of
+    processes worker processes (by default one per CPU), returning a list of their
+    BatchResults in the same order. With processes=1 the programs are run one after
+    another in this process.
+    '''
+    jobs = [ (p, options) for p in programs ]
+    if processes == 1:
+        return [ _run_job(j) for j in jobs ]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_run_job, jobs))
+
+def usage():
+    print( __doc__ )
+    sys.exit(0)
+
+if __name__ == "__main__" :
+    options = dict()
+    fmt = None
+    processes = None
+    try:
+        opts, args = getopt.getopt( sys.argv[1:], "a:bce:g:hi:j:mst:", ["adsel=","blocks","native","endianness=", \
+                "format=","help","maxinstr=","jobs=","memorydump","statistics","timeout="])
+    except getopt.GetoptError as  err:
+        print(err)
+        usage()
+
+    for opt, arg in opts:
+        if opt in ( "-a", "--adsel" ) :
+            options["adsel"] = int(arg,0)
+        elif opt in ( "-b", "--blocks" ) :
+            options["blocks"] = True
+        elif opt in ( "-c", "--native" ) :
+            options["backend"] = "native"
+        elif opt in ( "-e", "--endianness" ) :
+            options["endianness"] = arg
+        elif opt in ( "-g", "--format" ) :
+            if (arg in ("hex", "bin", "ihex")):
+                fmt = arg
+            else:
+                usage()
+        elif opt in ( "-i", "--maxinstr" ) :
+            options["max_instructions"] = int(arg,0)
+        elif opt in ( "-t", "--timeout" ) :
+            options["timeout"] = float(arg)
+        elif opt in ( "-j", "--jobs" ) :
+            processes = int(arg,0)
+        elif opt in ( "-m", "--memorydump" ) :
+            options["memorydump"] = True
+        elif opt in ( "-s", "--statistics" ) :
+            options["statistics"] = True
+        elif opt in ( "-h", "--help" ) :
+            usage()
+    if len(args) == 0:
+        usage()
+    for filename in args:
+        if not os.path.exists(filename):
+            print ("Cannot open file %s" % filename)
+            sys.exit(0)
+
+    programs = [ (f, fmt) if fmt != None else f for f in args ]
+    st = time.time()
+    results = run_batch(programs, processes, **options)
+    et = time.time()
+
+    print("# -------------------------------------------------------------------------------------------")
+    print("# Program                         Stop Reason       Halt  Instructions      Reads     Writes")
+    print("# -------------------------------------------------------------------------------------------")
+    for r in results:
+        print("  %-30s  %-16s  %4s  %12d %10d %10d" % (r.program, r.reason,
+              "" if r.halt_number == None else "%04X" % r.halt_number,
+              r.instr_count, r.read_count, r.write_count))
+        if r.error != None:
+            print("    %s" % r.error)
+    print("# -------------------------------------------------------------------------------------------")
+    print("# Programs                  : %10d" % len(results))
+    print("# Total instructions        : %10d" % sum(r.instr_count for r in results))
+    print("# Elapsed time              : %10.3f s" % (et - st))
+    print("# -------------------------------------------------------------------------------------------")
@@ -19,23 +19,58 @@ from F100_Opcodes.OpcodeF0_Halt import *
 from F100_Opcodes.OpcodeF0_Jump import *
 from F100_Opcodes.OpcodeF0_Bit import *
 
-from InstructionReg import InstructionReg
+from InstructionReg import InstructionReg, DECODE_TABLE
+from array import array
 from ConditionReg import ConditionReg
+from BlockTranslator import BlockTranslator
+from MemoryObserver import MemoryTracer
+from F100Snapshot import F100Snapshot
+from FlightRecorder import FlightRecorder
+from F100Timing import F100Timing
+from F100Interrupts import INSTRUCTIONS
+from F100MemoryMap import PAGE_SHIFT
+from F100IdleLoops import IdleLoopDetector, F100IdleException
 
 class F100CPU:
-    def __init__ (self, adsel=1, ramsize=32768, traceon=False, memtraceon=False ):
+    def __init__ (self, adsel=1, ramsize=32768, traceon=False, memtraceon=False, ram=None, statistics=False, flight_recorder=0, timing=None, idle_loops=False ):
+        ## RAM is held as 16 bit unsigned words in any mutable sequence which also supports
+        ## the buffer protocol, by default an array('H'). Another backend, e.g. a memoryview
+        ## cast to 'H' over shared memory, can be passed in via ram, in which case its
+        ## length sets the memory size. Indexing the backend must return plain ints.
+        if ram is None:
+            ram = array('H', [0]) * ramsize
+        ramsize = len(ram)
         self.MEMTOP = ramsize-1
         self.traceon = traceon
-        self.memtraceon = memtraceon        
+        ## Called for each instruction when traceon is set, after the opcode fetch and
+        ## before execution. Replaced by a binary trace writer (see F100Trace).
+        self.trace = self.print_machine_state
         self.CR = ConditionReg()
         self.IR = InstructionReg()
         self.OR = 0x0000
         self.adsel = adsel
         self.PC = 0x0000
         self.ACC= 0x0000
-        self.RAM = [0x0000]*ramsize
+        self.RAM = ram
         self.RAM_writeset = set()
+        ## Per-address cache of decoded instructions (a DecodedInstruction record each) and
+        ## their execute handlers, entries are invalidated by any write to the same address.
+        ## Only addresses actually executed get an entry so this is kept in a dict.
+        self.decode_cache = dict()
+        ## Cache of translated basic blocks (see BlockTranslator) by start address, with
+        ## the address range each one covers. The start addresses of the blocks covering each
+        ## address, and a map of all addresses holding decoded or translated code so that
+        ## writes to them can be caught, are only made once the first block is translated,
+        ## until then a write is checked against the decode cache alone.
+        self.block_cache = dict()
+        self.block_ranges = dict()
+        self.block_owners = None
+        self.code_map = None
+        ## Instruction times (see F100Timing) are looked up as each instruction is decoded
+        ## and accumulated in cycle_count, in input clock periods
+        self.timing = timing if timing != None else F100Timing()
         self.cycle_count = 0
+        self.halt_number = None
         self.read_count = 0
         self.write_count = 0
         self.modify_write_count = 0
@@ -49,6 +84,38 @@ class F100CPU:
         self.opcode_table = dict()
         for o in self.opcode_classes:
             self.opcode_table[o.F] = o
+        ## Flat table of execute handlers indexed by the top 10 bits of the instruction
+        ## word (F, T, R and S fields), which are all that is needed to select one
+        ## handler() returns a new bound method each call, so equal ones are shared
+        self.dispatch_table = [None]*1024
+        handlers = dict()
+        for i in range(0, 1024):
+            IR = DECODE_TABLE[i<<6]
+            if IR.F in self.opcode_table:
+                handler = self.opcode_table[IR.F].handler(IR)
+                self.dispatch_table[i] = handlers.setdefault(handler, handler)
+        self.translator = BlockTranslator(self)
+        ## Memory map of ROM and devices (see F100MemoryMap), None for all plain RAM
+        self.memory_map = None
+        self.page_table = None
+        ## Memory observers, with memory tracing provided by one of them
+        self.observers = []
+        self.memtracer = None
+        self.set_memtrace(memtraceon)
+        ## Ring buffer of the last flight_recorder instructions executed, if any, with its
+        ## record method looked up once for single_step() and block_step()
+        self.flight = FlightRecorder(flight_recorder) if flight_recorder else None
+        self.flight_record = self.flight.record if flight_recorder else None
+        self.exec_counts = None
+        self.profiler = None
+        ## Interrupt controller and event queue (see F100Interrupts), if any
+        self.interrupts = None
+        ## External Function handlers by 11 bit function number (see F100Coprocessors)
+        self.coprocessors = dict()
+        ## Idle loop detector (see F100IdleLoops), only made if idle loops are to be
+        ## skipped so that by default no handler is wrapped
+        self.idle = IdleLoopDetector(self) if idle_loops else None
+        self.set_statistics(statistics)
         self.reset()
 
     def print_machine_state(self):
@@ -60,7 +127,7 @@ class F100CPU:
         ((PC-1) & 0xFFFF,\
          IR.content, \
          self.ACC & 0xFFFF ,self.OR & 0xFFFF, \
-         CR.F,CR.M,CR.C,CR.S,CR.V,CR.Z,CR.I,\
+         *CR.unpack(),\
          self.memory_read(0,False,True), \
          self.memory_read((LSP-2) % 0x7FFF,False,True), \
          self.memory_read((LSP-1) %0x7FFF,False,True), \
@@ -68,27 +135,37 @@ class F100CPU:
          self.IR.name) )
 
     def interrupt(self, channel=0):
+        '''
+        Accept a program interrupt from channel 0-63, as at the end of an instruction:
+        store the PC and CR in the link stack as CAL does, clear M, set the Interrupt
+        Lock-out and continue from the interrupt vector at 2K/16K + 2n
+        '''
         channel = channel & 0x3F
-        lsp = self.CPU.memory_read(0)
+        lsp = self.memory_read(0)
         # save next PC (already incremented)
-        self.memory_write(lsp+1, self.CPU.PC)
-        self.memory_write(lsp+2, self.CPU.CR.toint())
+        self.memory_write(lsp+1, self.PC)
+        self.memory_write(lsp+2, self.CR.toint())
         self.memory_write(0, lsp+2)
+        self.CR.M = 0
         # disable further interrupts
         self.CR.I = 1
         # compute new PC address
         base_addr = 2048 if self.adsel == 1 else 16384
         destination = base_addr + 2 * channel
         self.PC = destination & 0x7FFF
+        self.cycle_count += self.timing.interrupt_time()
 
     def reset(self):
         self.cycle_count = 0
+        self.halt_number = None
         self.instr_count = 0
         self.read_count = 0
         self.write_count = 0
         self.modify_write_count = 0
         self.RAM_writeset = set()
         self.CR.reset()
+        if self.flight != None:
+            self.flight.clear()
         self.PC = 2048 if self.adsel == 1 else 16384
 
     def memory_fetch(self):
@@ -98,41 +175,598 @@ class F100CPU:
 
     def memory_read(self, address, nostats=False, notrace=False):
         a = address & 0xFFFF
-        data = self.RAM[a] & 0xFFFF
-
-        if self.memtraceon == True and not notrace:
-            print ("LOAD  : addr=0x%04X (%6d) data=0x%04X (%6d)"%(a, a, data, data));
-
-        if nostats== False:
+        try:
+            data = self.RAM[a]
+        except IndexError:
+            raise UserWarning("Memory out of range error for address 0x%04X" % a )
+        if nostats == False:
             self.read_count += 1
+        return data
 
-        if 0 <= a <= self.MEMTOP:
-            return data
-        else:
+    def memory_write(self, address, data, modify=False, nostats=False, notrace=False):
+        a = address & 0xFFFF
+        if nostats == False:
+            self.write_count += 1
+            if modify:
+                self.modify_write_count += 1
+        try:
+            self.RAM[a] = data & 0xFFFF
+        except IndexError:
             raise UserWarning("Memory out of range error for address 0x%04X" % a )
+        self.RAM_writeset.add(a)
+        code_map = self.code_map
+        if code_map is None:
+            if a in self.decode_cache:
+                self.invalidate_code(a)
+        elif code_map[a]:
+            self.invalidate_code(a)
 
-    def memory_write(self, address, data, modify=False, nostats=False, notrace=False):
+    def mapped_memory_read(self, address, nostats=False, notrace=False):
         a = address & 0xFFFF
-        if self.memtraceon == True and notrace==False:
-            print ("STORE : addr=0x%04X (%6d) data=0x%04X (%6d)"%(a, a, data, data));
+        device = self.page_table[a >> PAGE_SHIFT]
+        if device is None:
+            try:
+                data = self.RAM[a]
+            except IndexError:
+                raise UserWarning("Memory out of range error for address 0x%04X" % a )
+        else:
+            data = device.read(a) & 0xFFFF
+        if nostats == False:
+            self.read_count += 1
+        return data
 
+    def mapped_memory_write(self, address, data, modify=False, nostats=False, notrace=False):
+        a = address & 0xFFFF
+        device = self.page_table[a >> PAGE_SHIFT]
+        if device is None:
+            return F100CPU.memory_write(self, address, data, modify, nostats)
         if nostats == False:
             self.write_count += 1
             if modify:
                 self.modify_write_count += 1
-        if 0 <= a <= self.MEMTOP:
-            self.RAM[a] = (data & 0xFFFF)
-            self.RAM_writeset.add(a)
+        device.write(a, data & 0xFFFF)
+        if a in self.decode_cache or (self.code_map is not None and a <= self.MEMTOP and self.code_map[a]):
+            self.invalidate_code(a)
+
+    def observed_memory_read(self, address, nostats=False, notrace=False):
+        data = self.unobserved_memory_read(self, address, nostats)
+        if not notrace:
+            a = address & 0xFFFF
+            for o in self.observers:
+                o.read(a, data)
+        return data
+
+    def observed_memory_write(self, address, data, modify=False, nostats=False, notrace=False):
+        if not notrace:
+            a = address & 0xFFFF
+            for o in self.observers:
+                o.write(a, data)
+        self.unobserved_memory_write(self, address, data, modify, nostats)
+
+    def add_observer(self, observer):
+        '''
+        Attach a memory observer (see MemoryObserver), which is called for every traced
+        memory access until it is removed again
+        '''
+        self.observers.append(observer)
+        self.install_memory_functions()
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+        self.install_memory_functions()
+
+    def set_memory_map(self, memory_map):
+        '''
+        Attach a memory map (see F100MemoryMap), or detach it with None. Translated
+        blocks check the map as they are made, so all cached code is dropped.
+        '''
+        self.memory_map = memory_map
+        self.page_table = None if memory_map == None else memory_map.pages
+        self.install_memory_functions()
+        self.invalidate_all()
+
+    def install_memory_functions(self):
+        '''
+        Select the memory read and write functions used by the CPU and opcodes: the plain
+        class methods when there is no memory map and no observers attached, otherwise
+        the mapped and/or observed versions installed over them on this instance
+        '''
+        if self.memory_map != None:
+            self.unobserved_memory_read = F100CPU.mapped_memory_read
+            self.unobserved_memory_write = F100CPU.mapped_memory_write
         else:
-            raise UserWarning("Memory out of range error for address 0x%04X" % a )
+            self.unobserved_memory_read = F100CPU.memory_read
+            self.unobserved_memory_write = F100CPU.memory_write
+        if self.observers:
+            self.memory_read = self.observed_memory_read
+            self.memory_write = self.observed_memory_write
+        elif self.memory_map != None:
+            self.memory_read = self.mapped_memory_read
+            self.memory_write = self.mapped_memory_write
+        else:
+            self.__dict__.pop("memory_read", None)
+            self.__dict__.pop("memory_write", None)
+
+    def set_memtrace(self, enable):
+        '''
+        Turn printing of all memory accesses on or off
+        '''
+        if enable and self.memtracer == None:
+            self.memtracer = MemoryTracer()
+            self.add_observer(self.memtracer)
+        elif not enable and self.memtracer != None:
+            self.remove_observer(self.memtracer)
+            self.memtracer = None
+        self.memtraceon = enable
+
+    def decode(self, word, pc=None):
+        IR = DECODE_TABLE[word]
+        handler = self.dispatch_table[word >> 6]
+        if handler == None:
+            self.IR = IR
+            raise UserWarning("Cannot execute Opcode with function field 0x%X" % IR.F )
+        if self.exec_counts != None:
+            handler = self.counted(word, handler)
+        if self.profiler is not None:
+            handler = self.profiler.wrap(pc, IR, handler)
+        elif self.idle is not None:
+            handler = self.idle.wrap(pc, IR, handler)
+        return (IR, handler, self.timing.cycles(word), pc)
+
+    def set_statistics(self, enable):
+        '''
+        Enable or disable gathering per-instruction execution counts. When disabled the
+        counting is left out of the decoded handlers and translated blocks altogether.
+        '''
+        if enable and self.exec_counts == None:
+            ## One counter per instruction word, with a second set for shifts executed
+            ## with M set since those are reported as separate double length instructions
+            self.exec_counts = [0]*0x20000
+        elif not enable:
+            self.exec_counts = None
+        self.invalidate_all()
+
+    def set_timing(self, timing):
+        '''
+        Change the timing model, for example to another clock rate. Cached code holds
+        instruction times so it is all dropped.
+        '''
+        self.timing = timing
+        self.invalidate_all()
+
+    def set_profiler(self, profiler):
+        '''
+        Attach an instruction profiler (see InstructionProfiler), or detach it with None.
+        The profiler wraps the decoded handlers and adds its counts to translated blocks,
+        so all cached code is dropped.
+        '''
+        self.profiler = profiler
+        self.invalidate_all()
+
+    def set_coprocessor(self, function, handler):
+        '''
+        Register handler for External Function number function, or remove it with None.
+        The handler is called with the CPU and the function number and returns the
+        number of clock periods the function takes, or None.
+        '''
+        if not 0 <= function <= 0x07FF:
+            raise UserWarning("External Function number 0x%04X out of range" % function)
+        if handler == None:
+            self.coprocessors.pop(function, None)
+        else:
+            self.coprocessors[function] = handler
+
+    def set_idle_loops(self, enable):
+        '''
+        Enable or disable skipping idle loops in run(). The detector wraps the decoded
+        handlers of the instructions which close them, so all cached code is dropped.
+        '''
+        if enable and self.idle == None:
+            self.idle = IdleLoopDetector(self)
+        elif not enable:
+            self.idle = None
+        self.invalidate_all()
+
+    def set_interrupts(self, controller):
+        '''
+        Attach an interrupt controller (see F100Interrupts), or detach it with None. The
+        controller's events are then serviced by run().
+        '''
+        self.interrupts = controller
+
+    def counted(self, word, handler):
+        '''
+        Return handler wrapped to update the execution count for instruction word
+        '''
+        counts = self.exec_counts
+        if isinstance(handler.__self__, OpcodeF0_Shift):
+            CR = self.CR
+            def execute():
+                counts[word | (CR.M << 16)] += 1
+                return handler()
+        else:
+            def execute():
+                counts[word] += 1
+                return handler()
+        return execute
+
+    def collect_execstats(self):
+        '''
+        Aggregate the execution counts into the per-mnemonic execstats dictionary of each
+        opcode class, as used by the statistics report
+        '''
+        for o in self.opcode_classes:
+            for fn in o.execstats:
+                o.execstats[fn] = 0
+        if self.exec_counts == None:
+            return
+        for (i, count) in enumerate(self.exec_counts):
+            if count:
+                IR = DECODE_TABLE[i & 0xFFFF]
+                opcode = self.dispatch_table[IR.content >> 6].__self__
+                if isinstance(opcode, OpcodeF0_Shift):
+                    fn = opcode.disassemble(IR, M=i>>16)
+                else:
+                    fn = opcode.disassemble(IR)
+                opcode.execstats[fn] = opcode.execstats.get(fn, 0) + count
+
+    def memory_view(self):
+        '''
+        Return a zero-copy memoryview of RAM as 16 bit words
+        '''
+        return memoryview(self.RAM).cast('B').cast('H')
+
+    def memory_array(self):
+        '''
+        Return a zero-copy NumPy uint16 array of RAM. Changes made through the array
+        bypass the memory statistics and code invalidation, so call invalidate_all()
+        after writing to it. Needs NumPy to be installed.
+        '''
+        import numpy
+        return numpy.frombuffer(self.RAM, dtype=numpy.uint16)
+
+    def memory_snapshot(self):
+        '''
+        Return a copy of the RAM contents as an array('H')
+        '''
+        snapshot = array('H')
+        snapshot.frombytes(memoryview(self.RAM).cast('B'))
+        return snapshot
+
+    def memory_diff(self, snapshot, other=None):
+        '''
+        Return a sorted list of the addresses at which snapshot differs from other,
+        or from the current RAM contents if other is not given
+        '''
+        a = memoryview(snapshot).cast('B')
+        b = memoryview(self.RAM if other is None else other).cast('B')
+        if len(a) != len(b):
+            raise UserWarning("Cannot compare memory images of different sizes")
+        ## Compare in large blocks so that runs of unchanged memory are skipped over
+        ## as a single bytes comparison
+        BLKSZ = 1024
+        diffs = []
+        for i in range(0, len(a), BLKSZ):
+            if a[i:i+BLKSZ] != b[i:i+BLKSZ]:
+                wa = a[i:i+BLKSZ].cast('H')
+                wb = b[i:i+BLKSZ].cast('H')
+                diffs.extend( (i>>1) + j for j in range(len(wa)) if wa[j] != wb[j])
+        return diffs
+
+    def snapshot(self):
+        '''
+        Return an F100Snapshot of the machine state, to be passed to restore(). This is
+        RAM, adsel, the PC, ACC, OR, condition and instruction registers, the halt number,
+        the instruction, cycle and memory access counts, the set of written addresses and
+        the per-instruction execution counts if gathered.
+
+        The state of anything attached to the CPU is not included and is left as it is
+        by restore():
+
+        * the flight recorder entries (see FlightRecorder)
+        * the instruction profiler counts, routine totals and call stack
+          (see InstructionProfiler) and the memory profiler counts (see MemoryProfiler)
+        * the interrupt controller's pending events, lines and request counts, and the
+          timers' next events and tick counts (see F100Interrupts), which are scheduled
+          by cycle count so should be cleared or rescheduled after a restore
+        * the idle loop detector's skipped count (see F100IdleLoops), though restore()
+          forgets the loop it was in
+        * ROM contents and device registers in a memory map (see F100MemoryMap) and the
+          state of any coprocessors (see F100Coprocessors)
+        '''
+        return F100Snapshot(RAM=self.memory_snapshot(), adsel=self.adsel, PC=self.PC,
+                            ACC=self.ACC, OR=self.OR, CR=self.CR.toint(), IR=self.IR.content,
+                            halt_number=self.halt_number, cycle_count=self.cycle_count,
+                            instr_count=self.instr_count, read_count=self.read_count,
+                            write_count=self.write_count,
+                            modify_write_count=self.modify_write_count,
+                            RAM_writeset=frozenset(self.RAM_writeset),
+                            exec_counts=None if self.exec_counts == None else self.exec_counts[:])
+
+    def restore(self, snapshot):
+        '''
+        Return the machine to the state saved in snapshot, leaving the state which
+        snapshot() excludes unchanged. Only the pages of RAM which
+        differ from the snapshot are copied back, and decoded or translated code is only
+        dropped where it has changed. Execution counts are restored only if they are
+        being gathered both now and in the snapshot.
+        '''
+        if len(snapshot.RAM) != self.MEMTOP + 1:
+            raise UserWarning("Cannot restore a snapshot with a different memory size")
+        PAGESZ = 512
+        ram = self.RAM
+        saved = snapshot.RAM
+        ## Compare as bytes objects, which is much faster than comparing memoryviews
+        a = memoryview(ram).cast('B')
+        current = a.tobytes()
+        original = memoryview(saved).cast('B').tobytes()
+        if current != original:
+            if self.code_map is None:
+                ## Only decoded instructions to check, so look at each of those directly
+                for addr in [ addr for addr in self.decode_cache if ram[addr] != saved[addr] ]:
+                    self.invalidate_code(addr)
+            for i in range(0, len(a), 2*PAGESZ):
+                if current[i:i+2*PAGESZ] != original[i:i+2*PAGESZ]:
+                    if self.code_map is not None:
+                        page = i >> 1
+                        code = self.code_map[page:page+PAGESZ]
+                        if code.count(0) != len(code):
+                            for addr in range(page, page + len(code)):
+                                if self.code_map[addr] and ram[addr] != saved[addr]:
+                                    self.invalidate_code(addr)
+                    a[i:i+2*PAGESZ] = original[i:i+2*PAGESZ]
+        a.release()
+        self.adsel = snapshot.adsel
+        self.PC = snapshot.PC
+        self.ACC = snapshot.ACC
+        self.OR = snapshot.OR
+        self.CR.fromint(snapshot.CR)
+        self.IR = DECODE_TABLE[snapshot.IR]
+        self.halt_number = snapshot.halt_number
+        self.cycle_count = snapshot.cycle_count
+        self.instr_count = snapshot.instr_count
+        self.read_count = snapshot.read_count
+        self.write_count = snapshot.write_count
+        self.modify_write_count = snapshot.modify_write_count
+        self.RAM_writeset = set(snapshot.RAM_writeset)
+        if self.exec_counts != None and snapshot.exec_counts != None:
+            ## Update in place as the decoded handlers and blocks hold the list itself
+            self.exec_counts[:] = snapshot.exec_counts
+        if self.idle is not None:
+            self.idle.loop = None
+
+    def invalidate_all(self):
+        '''
+        Drop all decoded instructions and translated blocks, e.g. after RAM has been
+        changed other than through memory_write()
+        '''
+        self.decode_cache = dict()
+        self.block_cache = dict()
+        self.block_ranges = dict()
+        self.block_owners = None
+        self.code_map = None
+
+    def invalidate_code(self, address):
+        '''
+        Drop any decoded instruction or translated block using the word at address,
+        returning True if a translated block was removed
+        '''
+        self.decode_cache.pop(address, None)
+        if self.code_map is None:
+            return False
+        self.code_map[address] = 0
+        dropped = False
+        owners = self.block_owners
+        for start in owners.get(address, ()):
+            (end, block) = self.block_ranges.pop(start)
+            dropped = dropped or block != False
+            self.block_cache.pop(start, None)
+            ## Forget the block at every other address it covers
+            for a in range(start, end + 1):
+                if a != address:
+                    owners[a].remove(start)
+                    if not owners[a]:
+                        del owners[a]
+        owners.pop(address, None)
+        return dropped
 
     def single_step(self):
-        self.IR.update(self.memory_fetch())
-        if ( self.IR.F not in self.opcode_table):
-            raise UserWarning("Cannot execute Opcode with function field 0x%X" % self.IR.F )
+        pc = self.PC & 0xFFFF
+        self.instr_count += 1
+        entry = self.decode_cache.get(pc)
+        if entry is None:
+            word = self.memory_fetch()
+            entry = self.decode(word, pc)
+            self.decode_cache[pc] = entry
+            if self.code_map is not None:
+                self.code_map[pc] = 1
         else:
-            if self.traceon:
-                self.print_machine_state()
-            self.opcode_table[self.IR.F].execute()
+            # Opcode word already decoded, but still account for the fetch as
+            # memory_fetch() would
+            if self.observers:
+                self.memory_read(pc)
+            else:
+                self.read_count += 1
+            self.PC = ( pc + 1 )  & 0x7FFF
+        self.IR = entry[0]
+        record = self.flight_record
+        if record is not None:
+            record(entry)
+        if self.traceon:
+            self.trace()
+        self.cycle_count += entry[2] + entry[1]()
 
         return
+
+    def run(self, max_instructions=None, until=None, max_cycles=None, blocks=False):
+        '''
+        Run the CPU until it halts or one of the optional stop conditions is met, and
+        return the reason for stopping as one of the strings:
+
+        * "HALT"             - a HALT instruction was executed, its number is left in
+                               halt_number
+        * "UNTIL"            - the until condition was met
+        * "MAX_INSTRUCTIONS" - max_instructions more instructions have been executed
+        * "MAX_CYCLES"       - the cycle count has reached max_cycles
+        * "IDLE"             - the CPU is in an idle loop which nothing can end, see
+                               F100IdleLoops
+
+        until may be either an address, in which case the run stops when the PC reaches
+        it, or a function which is called with the CPU after every instruction and stops
+        the run by returning True.
+
+        With blocks=True execution uses block_step() where possible. The instruction limit
+        is still honoured exactly, but a cycle limit may be overrun by up to one block.
+        Tracing, or an until condition, always single steps.
+
+        With an interrupt controller attached the run is split at each scheduled event,
+        see run_events().
+
+        With idle_loops=True, or after set_idle_loops(True), idle loops are skipped up to
+        the next limit or event. Tracing, memory observers, the instruction profiler and an
+        until condition all turn skipping off.
+        '''
+        if self.interrupts is not None:
+            return self.run_events(max_instructions, until, max_cycles, blocks)
+        return self.run_segment(max_instructions, until, max_cycles, blocks)
+
+    def run_events(self, max_instructions=None, until=None, max_cycles=None, blocks=False):
+        '''
+        Run as run() with the interrupt controller attached. Each segment of the run stops
+        at the next scheduled event using the instruction or cycle limit, so nothing is
+        checked between instructions, then the due events are serviced and any request
+        accepted. While a request is held off by the Interrupt Lock-out the CPU single
+        steps instead, so that the request is accepted as soon as I is cleared.
+        '''
+        controller = self.interrupts
+        limit = None if max_instructions == None else self.instr_count + max_instructions
+        while True:
+            controller.service()
+            if limit != None and self.instr_count >= limit:
+                return "MAX_INSTRUCTIONS"
+            if max_cycles != None and self.cycle_count >= max_cycles:
+                return "MAX_CYCLES"
+            n = None if limit == None else limit - self.instr_count
+            cycles = max_cycles
+            if controller.waiting():
+                n = 1
+            else:
+                due = controller.next_due()
+                if due == None:
+                    pass
+                elif controller.unit == INSTRUCTIONS:
+                    n = due - self.instr_count if n == None else min(n, due - self.instr_count)
+                else:
+                    cycles = due if cycles == None else min(cycles, due)
+            reason = self.run_segment(n, until, cycles, blocks)
+            if reason in ("HALT", "UNTIL", "IDLE"):
+                return reason
+
+    def run_segment(self, max_instructions=None, until=None, max_cycles=None, blocks=False):
+        '''
+        Run as run() without servicing interrupts
+        '''
+        step = self.block_step if blocks and until == None else self.single_step
+        if max_instructions != None:
+            limit = self.instr_count + max_instructions
+            ## block_step() may run a full block plus one instruction, so leave enough
+            ## headroom and single step the remainder
+            block_limit = limit - (BlockTranslator.MAX_BLOCK_LENGTH + 1) if step == self.block_step else limit
+        if until == None:
+            check = None
+        elif callable(until):
+            check = until
+        else:
+            address = until & 0x7FFF
+            check = lambda cpu : cpu.PC == address
+        idle = self.idle
+        if idle is not None and check == None and not self.traceon and not self.observers and self.profiler is None:
+            idle.horizon = (limit if max_instructions != None else None, max_cycles)
+
+        try:
+            if check == None and max_cycles == None:
+                if max_instructions == None:
+                    while True:
+                        step()
+                else:
+                    while self.instr_count < block_limit:
+                        step()
+                    while self.instr_count < limit:
+                        self.single_step()
+                    return "MAX_INSTRUCTIONS"
+            else:
+                while True:
+                    if max_instructions != None and self.instr_count >= limit:
+                        return "MAX_INSTRUCTIONS"
+                    if max_cycles != None and self.cycle_count >= max_cycles:
+                        return "MAX_CYCLES"
+                    if max_instructions != None and self.instr_count >= block_limit:
+                        self.single_step()
+                    else:
+                        step()
+                    if check != None and check(self):
+                        return "UNTIL"
+        except F100HaltException:
+            return "HALT"
+        except F100IdleException:
+            return "IDLE"
+        finally:
+            if idle is not None:
+                idle.horizon = None
+
+    def block_step(self):
+        '''
+        Execute the translated basic block starting at the current PC, followed by the
+        instruction which terminates it. Translations are made on first use and cached
+        until any of the code they cover is overwritten.
+
+        Tracing and memory observers need to see every instruction so fall back to
+        single_step() when either is enabled.
+        '''
+        if self.traceon or self.observers:
+            return self.single_step()
+        pc = self.PC & 0xFFFF
+        block = self.block_cache.get(pc)
+        if block is None:
+            block = self.block_cache[pc] = self.translate_block(pc)
+        if block:
+            record = self.flight_record
+            if record is None:
+                block(self)
+            else:
+                try:
+                    block(self)
+                finally:
+                    record((pc, self.PC, self.ACC, self.OR, self.CR.toint()))
+        self.single_step()
+        return
+
+    def translate_block(self, start):
+        '''
+        Translate the block at address start, recording the range it covers in the code
+        map. Returns False if there is no translatable code at that address.
+        '''
+        if start > self.MEMTOP:
+            return False
+        result = self.translator.translate(start)
+        if result == None:
+            ## Remember the failure too, but retry if the instruction or its operand
+            ## is overwritten later
+            (block, end) = (False, min(start + 1, self.MEMTOP))
+        else:
+            (block, end) = result
+        if self.code_map is None:
+            ## First block, so start tracking all code by address
+            self.code_map = bytearray(self.MEMTOP + 1)
+            self.block_owners = dict()
+            for a in self.decode_cache:
+                self.code_map[a] = 1
+        self.block_ranges[start] = (end, block)
+        owners = self.block_owners
+        for a in range(start, end + 1):
+            if a in owners:
+                owners[a].append(start)
+            else:
+                owners[a] = [start]
+        self.code_map[start:end+1] = b'\x01' * (end + 1 - start)
+        return block
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+## ============================================================================
+## F100CoSim.py - Lock-step co-simulation of the Python and C F100-L emulators
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+USAGE:
+
+  F100CoSim runs a program on the Python emulator and the C core (see F100Native)
+  side by side and compares their state every interval instructions: PC, ACC, OR,
+  condition register, instruction and memory access counts and the first 32K words
+  of memory. When the two differ it bisects back to the first instruction after
+  which they disagree and reports the state of both at that point.
+
+REQUIRED SWITCHES ::
+
+  -f --filename  <filename>      specify the assembled object file
+
+  -g --format    <bin|ihex|hex>  set the file format for the assembled code
+
+OPTIONAL SWITCHES ::
+
+  -a --adsel      <0|1>          specify the state of the AdSel pin
+                                 - defaults to 1 if not specified
+
+  -e --endianness <little|big>   set endianness of byte oriented input file
+                                 - default is little-endian
+
+  -i --interval   <int>          number of instructions between comparisons
+                                 - defaults to 10000
+
+  -n --maxinstr   <int>          stop after this many instructions
+
+  -h --help                      print this help message
+
+EXAMPLES ::
+
+  python3 F100CoSim.py -f pi-spigot.hex -g hex
+
+The C core has to be built first with 'make libf100.so' in csrc.
+
+'''
+
+from F100Emu import F100Emu
+from F100Native import F100NativeCPU, native_available
+from InstructionReg import DECODE_TABLE
+from collections import namedtuple
+import getopt
+import os.path
+import sys
+
+## Architectural state compared between the two emulators. Words of memory are held
+## as a bytes object so that they compare quickly, and error holds the message of any
+## exception raised by the Python emulator.
+CoSimState = namedtuple("CoSimState", "instr_count PC ACC OR CR read_count write_count halted error memory")
+
+## Report of the first instruction after which the emulators disagree: its address
+## and instruction word, the state of each emulator immediately before it (the same
+## for both) and immediately after it, and the names of the fields which differ.
+Divergence = namedtuple("Divergence", "instr_count PC IR before python native fields")
+
+class F100CoSim:
+    def __init__ (self, adsel=1, interval=10000, blocks=True):
+        if not native_available():
+            raise UserWarning("Native F100 library not found, build it with 'make libf100.so' in csrc")
+        self.emu = F100Emu(adsel=adsel, statistics=False)
+        self.python = self.emu.CPU
+        self.native = F100NativeCPU(adsel=adsel)
+        self.interval = interval
+        self.blocks = blocks
+        self.words = self.python.MEMTOP + 1
+
+    def load_memory(self, filename, file_format, endianness="little"):
+        '''
+        Load a program into the Python emulator and copy it over to the C core
+        '''
+        self.emu.load_memory(filename, file_format, endianness)
+        self.native.RAM[0:self.words] = memoryview(self.python.RAM).cast('B').cast('H')
+        self.reset()
+
+    def reset(self):
+        self.python.reset()
+        self.native.reset()
+
+    def state(self, cpu, halted, error=None):
+        memory = memoryview(cpu.RAM).cast('B')[0:2*self.words].tobytes()
+        return CoSimState(cpu.instr_count, cpu.PC & 0x7FFF, cpu.ACC & 0xFFFF, cpu.OR & 0xFFFF,
+                          cpu.CR.toint(), cpu.read_count, cpu.write_count, halted, error, memory)
+
+    def step(self, n):
+        '''
+        Run both emulators for up to n instructions and return their states
+        '''
+        error = None
+        try:
+            halted = self.python.run(max_instructions=n, blocks=self.blocks) == "HALT"
+        except Exception as e:
+            ## Any failure of the Python emulator is a result to compare, not just the
+            ## UserWarnings it raises for errors in the program
+            (halted, error) = (False, str(e))
+        python = self.state(self.python, halted, error)
+        native = self.state(self.native, self.native.execute(n))
+        return (python, native)
+
+    def save(self):
+        return (self.python.snapshot(), self.native.snapshot())
+
+    def restore(self, saved):
+        self.python.restore(saved[0])
+        self.native.restore(saved[1])
+
+    def run(self, max_instructions=None):
+        '''
+        Run both emulators until they halt, disagree or have executed max_instructions,
+        returning a Divergence for the first instruction after which they disagree or
+        None if they agree throughout
+        '''
+        done = 0
+        while max_instructions == None or done < max_instructions:
+            n = self.interval if max_instructions == None else min(self.interval, max_instructions - done)
+            saved = self.save()
+            (python, native) = self.step(n)
+            if python != native:
+                return self.bisect(saved, n)
+            if python.halted or python.error != None:
+                return None
+            done += n
+        return None
+
+    def bisect(self, saved, n):
+        '''
+        Starting from the saved states, which agree, find the first instruction within
+        the next n after which the emulators disagree
+        '''
+        while n > 1:
+            half = n // 2
+            self.restore(saved)
+            (python, native) = self.step(half)
+            if python == native:
+                saved = self.save()
+                n -= half
+            else:
+                n = half
+        self.restore(saved)
+        PC = self.python.PC & 0x7FFF
+        before = self.state(self.python, False)
+        (python, native) = self.step(1)
+        fields = [ f for f in CoSimState._fields if getattr(python, f) != getattr(native, f) ]
+        return Divergence(before.instr_count, PC, self.python.RAM[PC], before, python, native, fields)
+
+def print_state(name, state, other):
+    print("%-6s: instr=%d PC=%04X ACC=%04X OR=%04X CR=%s reads=%d writes=%d%s%s" % (
+        name, state.instr_count, state.PC, state.ACC, state.OR, format(state.CR, "07b"),
+        state.read_count, state.write_count, " HALTED" if state.halted else "",
+        " ERROR: %s" % state.error if state.error != None else ""))
+    if state.memory != other.memory:
+        a = memoryview(state.memory).cast('H')
+        b = memoryview(other.memory).cast('H')
+        diffs = [ i for i in range(0, len(a)) if a[i] != b[i] ]
+        print("        memory: " + " ".join("%04X=%04X" % (i, a[i]) for i in diffs[:8]) +
+              (" ..." if len(diffs) > 8 else ""))
+
+def print_divergence(d):
+    print("# Emulators disagree after instruction %d at PC %04X : %04X %s" % (
+        d.instr_count + 1, d.PC, d.IR, DECODE_TABLE[d.IR].name))
+    print("# Differing fields: %s" % ", ".join(d.fields))
+    print_state("before", d.before, d.before)
+    print_state("python", d.python, d.native)
+    print_state("native", d.native, d.python)
+
+def usage():
+    print( __doc__ )
+    sys.exit(0)
+
+if __name__ == "__main__" :
+    filename = ""
+    file_format = ""
+    adsel = 1
+    endianness = "little"
+    interval = 10000
+    max_instructions = None
+    try:
+        opts, args = getopt.getopt( sys.argv[1:], "a:e:f:g:hi:n:", ["adsel=","endianness=", \
+                "filename=","format=","help","interval=","maxinstr="])
+    except getopt.GetoptError as  err:
+        print(err)
+        usage()
+
+    for opt, arg in opts:
+        if opt in ( "-f", "--filename" ) :
+            filename = arg
+        elif opt in ( "-a", "--adsel" ) :
+            adsel = int(arg,0)
+        elif opt in ( "-e", "--endianness" ) :
+            endianness = arg
+        elif opt in ( "-g", "--format" ) :
+            if (arg in ("hex", "bin", "ihex")):
+                file_format = arg
+            else:
+                usage()
+        elif opt in ( "-i", "--interval" ) :
+            interval = int(arg,0)
+        elif opt in ( "-n", "--maxinstr" ) :
+            max_instructions = int(arg,0)
+        elif opt in ( "-h", "--help" ) :
+            usage()
+    if filename=="" or file_format=="":
+        usage()
+    elif not os.path.exists(filename):
+        print ("Cannot open file %s" % filename)
+        sys.exit(0)
+
+    cosim = F100CoSim(adsel=adsel, interval=interval)
+    cosim.load_memory(filename, file_format, endianness)
+    divergence = cosim.run(max_instructions)
+    if divergence == None:
+        print("# Emulators agree over %d instructions" % cosim.python.instr_count)
+    else:
+        print_divergence(divergence)
+        sys.exit(1)
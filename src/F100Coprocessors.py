@@ -0,0 +1,126 @@
+## ============================================================================
+## F100Coprocessors.py - External Function units for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Coprocessors
+------------
+
+External Function instructions (F=0, T=2 or 3) pass control to a Special Processing
+Unit (SPU) selected by an 11 bit function number, as in section 1.12 of the F100-L
+Hardware Data Book. The CPU keeps a registry of Python handlers by function number,
+set with F100CPU.set_coprocessor(). Each handler is called with the CPU and the
+function number, can read and write ACC, OR, the condition register and memory, and
+returns the time the function takes in input clock periods, which is added to the
+time for the instruction itself (see F100Timing), or None. An External Function with
+no handler times out as on the real part, setting the F (Fail) flag.
+
+A Coprocessor registers a set of its methods as handlers when attached to a CPU.
+MultiplyDivideUnit is the unit provided, with the function numbers assembled by the
+MUL, UDIV, MUL32 and UDIV32 mnemonics (see OpcodeF0_Halt). Its 32 bit functions take
+their operands from the user stack in the same way as the routines of the same names
+in mathlib.asm, so that a program can use either.
+'''
+
+from F100_Opcodes.OpcodeF0_Halt import EXTERNAL_FUNCTIONS
+
+class Coprocessor:
+    '''
+    Base class for coprocessors, where functions is a dictionary of function number to
+    handler
+    '''
+    def __init__ (self):
+        self.functions = dict()
+        self.CPU = None
+
+    def attach(self, CPU):
+        self.CPU = CPU
+        for (function, handler) in self.functions.items():
+            CPU.set_coprocessor(function, handler)
+
+    def detach(self):
+        if self.CPU != None:
+            for function in self.functions:
+                self.CPU.set_coprocessor(function, None)
+
+
+class MultiplyDivideUnit(Coprocessor):
+    '''
+    Unsigned multiply and divide unit. The function numbers are taken from numbers, a
+    dictionary of mnemonic to number, and the 32 bit functions use the user stack
+    pointer at location stack_pointer. Every function takes cycles clock periods.
+
+    * MUL    - ACC * OR, leaving the high word of the product in ACC and the low in OR
+    * UDIV   - ACC / OR, leaving the quotient in ACC and the remainder in OR. V is set
+      on division by zero, which leaves both unchanged, and cleared otherwise.
+    * MUL32  - multiply two 32 bit numbers on the user stack, as MUL32 in mathlib.asm
+    * UDIV32 - divide two 32 bit numbers on the user stack, as UDIV32 in mathlib.asm,
+      including its results for a zero denominator
+    '''
+    def __init__ (self, numbers=EXTERNAL_FUNCTIONS, stack_pointer=1, cycles=0):
+        super().__init__()
+        self.stack_pointer = stack_pointer
+        self.cycles = cycles
+        for (name, handler) in (("MUL", self.mul), ("UDIV", self.udiv), ("MUL32", self.mul32), ("UDIV32", self.udiv32)):
+            self.functions[numbers[name]] = handler
+
+    def mul(self, CPU, function):
+        product = CPU.ACC * CPU.OR
+        CPU.ACC = (product >> 16) & 0xFFFF
+        CPU.OR = product & 0xFFFF
+        return self.cycles
+
+    def udiv(self, CPU, function):
+        if CPU.OR == 0:
+            CPU.CR.V = 1
+        else:
+            (CPU.ACC, CPU.OR) = divmod(CPU.ACC, CPU.OR)
+            CPU.CR.V = 0
+        return self.cycles
+
+    def read_stack(self, CPU):
+        '''
+        Return the user stack pointer and the two 32 bit operands below it, each stored
+        with its low word at the higher address
+        '''
+        sp = CPU.memory_read(self.stack_pointer)
+        words = [ CPU.memory_read((sp - i) & 0xFFFF) for i in range(0, 4) ]
+        return (sp, (words[1] << 16) | words[0], (words[3] << 16) | words[2])
+
+    def write_stack(self, CPU, sp, words):
+        for (i, word) in enumerate(words):
+            CPU.memory_write((sp - i) & 0xFFFF, word & 0xFFFF)
+
+    def mul32(self, CPU, function):
+        (sp, a, b) = self.read_stack(CPU)
+        product = a * b
+        self.write_stack(CPU, sp, [ product >> shift for shift in (0, 16, 32, 48) ])
+        return self.cycles
+
+    def udiv32(self, CPU, function):
+        (sp, n, d) = self.read_stack(CPU)
+        if d == 0:
+            ## The shift and subtract loop of the routine always succeeds
+            (q, r) = (0xFFFFFFFF, n)
+        else:
+            (q, r) = divmod(n, d)
+        self.write_stack(CPU, sp, [ q, q >> 16, r, r >> 16 ])
+        return self.cycles
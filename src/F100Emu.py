@@ -38,6 +38,15 @@ OPTIONAL SWITCHES ::
   -a --adsel      <0|1>          specify the state of the AdSel pin
                                  - defaults to 1 if not specified
 
+  -b --blocks                    translate and cache straight line blocks of code
+                                 rather than single stepping every instruction
+                                 (see BlockTranslator). Ignored when either trace
+                                 is enabled.
+
+  -c --native                    run on the C core from csrc/libf100.so if it has
+                                 been built (see F100Native), otherwise in Python.
+                                 Per-instruction statistics are not available.
+
   -e --endianness <little|big>   set endianness of byte oriented input file
                                  - default is little-endian
 
@@ -46,6 +55,10 @@ OPTIONAL SWITCHES ::
 
   -t --traceon                   print all memory transactions to stdout
 
+  -r --record    <filename>      write a binary trace of every instruction to file,
+                                 including memory accesses if -m is also given. See
+                                 F100Trace for the format and a reader.
+
   -m  --memorydump <filename>    dump memory to file at end of run.
 
                                  Memory dump will by default write address and data for all
@@ -58,7 +71,83 @@ OPTIONAL SWITCHES ::
 
   -q  --memoryend   <int>        end of memory dump range
 
-  -s  --statistics               print extended statistics summary at end of run
+  -s  --statistics               print extended statistics summary at end of run.
+                                 Per-instruction counts are only gathered when this
+                                 is given.
+
+  -w --heatmap   <filename>      count the reads, writes and read-modify-writes of
+                                 every memory address and write them to file as CSV
+                                 if it ends .csv, as NumPy if it ends .npy and
+                                 otherwise as a text report and map (see
+                                 MemoryProfiler). The busiest addresses are also
+                                 printed at the end of the run. Always runs in Python
+                                 and without blocks.
+
+  -k --bucket    <int>           number of words counted together by -w, default 1
+
+  -i --profile                   count the instructions executed at every address
+                                 and in every subroutine call, and print the busiest
+                                 routines and labels at the end of the run (see
+                                 InstructionProfiler). Always runs in Python.
+
+  -y --symbols   <filename>      symbol file written by F100Asm -y, used to name
+                                 the addresses in profiles
+
+  -z --clock     <MHz>           input clock rate used to report the simulated run
+                                 time from the cycle count (see F100Timing)
+                                 - defaults to 8 MHz
+
+  -u --timer     <n>:<us>        interrupt on channel n every us microseconds of
+                                 simulated time, at the clock rate given by -z. May
+                                 be given more than once (see F100Interrupts).
+                                 Always runs in Python.
+
+  -j --interrupt <n>:<us>        request an interrupt on channel n once, after us
+                                 microseconds of simulated time. May be given more
+                                 than once. Always runs in Python.
+
+  -o --console   <int>           map a console output port with its status register
+                                 at the given address and its data register at the
+                                 next one, for example 0x7EF8. Each word written to
+                                 the data register is printed as a character. The
+                                 port takes the whole of its page of memory (see
+                                 F100MemoryMap). Always runs in Python.
+
+  -v --rom       <start>:<end>   make memory from start to end, on page boundaries,
+                                 read only after the program is loaded. May be given
+                                 more than once. Always runs in Python.
+
+     --muldiv                    attach the multiply/divide coprocessor, which
+                                 executes the MUL, UDIV, MUL32 and UDIV32 External
+                                 Functions (see F100Coprocessors). Without it they
+                                 set the F flag and do nothing. Always runs in Python.
+
+     --idle                      skip idle loops ahead to the next event rather than
+                                 executing them in full (see F100IdleLoops). The
+                                 skipped instructions are counted in the statistics,
+                                 and a run stuck in an idle loop with nothing to end
+                                 it stops with IDLE. Always runs in Python.
+
+     --maxinstr  <int>           stop the run after this many instructions
+
+     --maxcycles <int>           stop the run once the cycle count reaches this many
+                                 input clock periods. Ignored by the C core.
+
+     --timeout   <seconds>       stop the run after this much wall clock time,
+                                 checked every 20000 instructions
+
+     --json      <filename>      headless mode: print nothing but the program's own
+                                 output, and write the result of the run to file,
+                                 or to stdout if the filename is -, as a JSON
+                                 object. The exit status is 0 if the program
+                                 halted, with the number given by -x if any, and 1
+                                 otherwise.
+
+  -x --expecthalt <int>          halt number expected at the end of a normal run.
+                                 The last instructions executed are printed from the
+                                 flight recorder (see FlightRecorder) if the program
+                                 halts with any other number, as they are whenever
+                                 the run stops with an error.
 
   -h --help                      print this help message
 
@@ -73,10 +162,19 @@ banner =\
 # F 1 0 0 - L * E M U L A T O R (c) 2016, 2017, 2019 Revaldinho & BigEd
 # ---------------------------------------------------------------------------'''
 
-from F100_Opcodes.F100_Opcode import F100HaltException
 from F100CPU import F100CPU
-from hex2bin import Hex2Bin
+from F100Trace import TraceWriter
+from MemoryProfiler import MemoryProfiler
+from InstructionProfiler import InstructionProfiler
+from F100Symbols import read_symbol_file
+from F100Timing import F100Timing
+from F100Interrupts import InterruptController, Timer
+from F100MemoryMap import MemoryMap, ConsoleOutput, ROM, PAGE_SIZE
+from F100Coprocessors import MultiplyDivideUnit
+from F100Loader import load_image
+from array import array
 import getopt
+import json
 import time
 import sys
 import os.path
@@ -90,56 +188,90 @@ def print_header():
     print("# PC  :   OP :  ACC   OR : FMCSVZI :  LSP (LSP-2)(LSP-1)(LSP-0): Instruction")
     print("# ---------------------------------------------------------------------------")
 
-def INTTOPRINT(c):
-    if (c>31 and c<128):
-        return c
-    else:
-        return '.'
+## Translation table mapping each byte to its printable character, or '.'
+PRINTABLE = bytes( c if (c>31 and c<128) else ord('.') for c in range(256))
 
 def hex16dump( data, dlen, filename=None):
     GRPSZ = 16
-    astr = list()
-    dstr = list()
 
     max = dlen + ((dlen + GRPSZ - dlen%GRPSZ) if (dlen%GRPSZ>0) else 0)
     if ( filename != None ) :
         f = open(filename,"w")
     else:
         f =sys.stdout
-    for i in range (0, max):
-        j=i%GRPSZ;
-        dstr.append("%04X" % data[i] )
-        astr.append("%c%c" % (INTTOPRINT((data[i]>>8)&0xFF),INTTOPRINT(data[i]&0xFF)))
-        if (j==GRPSZ-1) :
-            f.write( "%04X: %s %s%c" % ( i-j, ' '.join(dstr), ''.join(astr), '\n' if (i>0) else '\0'))
-            astr = list()
-            dstr = list()
+    ## Work on whole rows at a time, taking the ASCII column from a big-endian byte copy
+    ## of the data
+    words = array('H', data[0:max - max%GRPSZ])
+    if sys.byteorder == "little":
+        words.byteswap()
+    chars = words.tobytes().translate(PRINTABLE).decode('latin-1')
+    if sys.byteorder == "little":
+        words.byteswap()
+    rowfmt = "%04X: " + ' '.join(["%04X"]*GRPSZ) + " %s\n"
+    for i in range (0, len(words), GRPSZ):
+        f.write( rowfmt % ((i,) + tuple(words[i:i+GRPSZ]) + (chars[2*i:2*i+2*GRPSZ],)))
+
+def print_flight_recorder(CPU):
+    if CPU.flight != None:
+        print("# ---------------------------------------------------------------------------")
+        CPU.flight.dump()
+        print("# ---------------------------------------------------------------------------")
 
 class F100Emu:
-    def __init__ (self, adsel=1, traceon=False, memtraceon=False):
-        self.CPU = F100CPU(adsel=adsel, traceon=traceon, memtraceon=memtraceon)
+
+    ## Instructions run between checks of the wall clock time limit of run()
+    TIMEOUT_CHUNK = 20000
+
+    def __init__ (self, adsel=1, traceon=False, memtraceon=False, statistics=False, backend="python", flight_recorder=64,
+                  timing=None, idle_loops=False):
+        options = dict(adsel=adsel, traceon=traceon, memtraceon=memtraceon, statistics=statistics,
+                       flight_recorder=flight_recorder, timing=timing, idle_loops=idle_loops)
+        if backend == "python":
+            self.CPU = F100CPU(**options)
+        else:
+            ## ctypes and the C core are only loaded when the native backend is asked for
+            from F100Native import create_cpu
+            self.CPU = create_cpu(backend, **options)
         self.traceon = traceon
         self.memtraceon = memtraceon
-        self.instr_count = 0
-
-    def load_memory(self, filename, file_format):
-        # Initialise the hex2bin object with a 64Kbyte address space
-        h = Hex2Bin(0x10000)
-        h.read_file(filename, file_format, 0, 0x10000)
-        # Now convert into the local RAM
-        for i in range(0, 64*1024,2):
-            local_addr = i >> 1
-            if endianness == "little":
-                (byte_lo,valid) = h.read_byte(i)
-                i+=1
-                (byte_hi,valid) = h.read_byte(i)
-                i+=1
-            else:
-                (byte_hi,valid) = h.read_byte(i)
-                i+=1
-                (byte_lo,valid) = h.read_byte(i)
-                i+=1
-            self.CPU.memory_write(local_addr, ((byte_hi << 8) | byte_lo ) & 0xFFFF, nostats=True, notrace=True )
+
+    def load_memory(self, filename, file_format, endianness="little", start=0, end=None):
+        '''
+        Load the program in filename, in bin, hex or ihex format with words in the given
+        byte order, into memory from start to end inclusive, by default all of it. See
+        F100Loader.
+        '''
+        load_image(self.CPU, filename, file_format, endianness, start, end)
+
+    def run(self, blocks=False, max_instructions=None, max_cycles=None, timeout=None):
+        '''
+        Run the loaded program as F100CPU.run() does, with an optional limit of timeout
+        seconds of wall clock time, which is checked after every TIMEOUT_CHUNK
+        instructions. Returns a tuple of the reason for stopping, "TIMEOUT" if the time
+        limit was reached and otherwise as for F100CPU.run(), and the time in seconds
+        spent in the run loop alone. With idle loops skipped and no other limits, a
+        program stuck in an idle loop stops with "IDLE" as it would without the time
+        limit, though with the instructions skipped up to the last check counted.
+        '''
+        CPU = self.CPU
+        st = time.time()
+        if timeout == None:
+            reason = CPU.run(max_instructions=max_instructions, max_cycles=max_cycles, blocks=blocks)
+        else:
+            deadline = st + timeout
+            limit = None if max_instructions == None else CPU.instr_count + max_instructions
+            while True:
+                n = self.TIMEOUT_CHUNK if limit == None else min(self.TIMEOUT_CHUNK, limit - CPU.instr_count)
+                reason = CPU.run(max_instructions=n, max_cycles=max_cycles, blocks=blocks)
+                if reason != "MAX_INSTRUCTIONS" or (limit != None and CPU.instr_count >= limit):
+                    break
+                if limit == None and max_cycles == None and CPU.idle != None and CPU.idle.stuck():
+                    reason = "IDLE"
+                    break
+                if time.time() >= deadline:
+                    reason = "TIMEOUT"
+                    break
+        return (reason, time.time() - st)
 
 
 
@@ -156,10 +288,32 @@ if __name__ == "__main__" :
     memdump_lo = None
     memdump_hi = None
     statson = False
+    blockson = False
+    backend = "python"
+    record_filename = None
+    expected_halt = None
+    heatmap_filename = None
+    bucket = 1
+    symbols = None
+    profileon = False
+    clock = 8000000
+    timers = []
+    interrupts = []
+    console = None
+    roms = []
+    muldiv = False
+    idleskip = False
+    max_instructions = None
+    max_cycles = None
+    timeout = None
+    json_filename = None
     try:
-        opts, args = getopt.getopt( sys.argv[1:], "a:e:f:g:d:p:q:hmnst", ["adsel=","endianness=", \
+        opts, args = getopt.getopt( sys.argv[1:], "a:bce:f:g:d:ij:k:o:p:q:r:u:v:w:x:y:z:hmnst", ["adsel=","blocks","native","endianness=", \
                 "filename=","format=","memorydump=","memorystart=", "memoryend=","help",\
-                "memtraceon","nolisting","statistics","traceon"])
+                "memtraceon","nolisting","record=","statistics","traceon","expecthalt=", \
+                "heatmap=","bucket=","symbols=","profile","clock=","timer=","interrupt=", \
+                "console=","rom=","muldiv","idle","maxinstr=","maxcycles=","timeout=", \
+                "json="])
     except getopt.GetoptError as  err:
         print(err)
         usage()
@@ -172,6 +326,10 @@ if __name__ == "__main__" :
             memdumpon = True
         if opt in ( "-a", "--adsel" ) :
             adsel = int(arg,0)
+        if opt in ( "-b", "--blocks" ) :
+            blockson = True
+        if opt in ( "-c", "--native" ) :
+            backend = "native"
         if opt in ( "-p", "--memorystart" ) :
             memdump_lo = int(arg,0)
         if opt in ( "-q", "--memoryend" ) :
@@ -185,6 +343,43 @@ if __name__ == "__main__" :
                 usage()
         if opt in ("-n", "--nolisting") :
             listingon = False
+        if opt in ("-r", "--record") :
+            record_filename = arg
+        if opt in ("-w", "--heatmap") :
+            heatmap_filename = arg
+        if opt in ("-k", "--bucket") :
+            bucket = int(arg,0)
+        if opt in ("-i", "--profile") :
+            profileon = True
+        if opt in ("-y", "--symbols") :
+            symbols = read_symbol_file(arg)
+        if opt in ("-z", "--clock") :
+            clock = int(float(arg) * 1000000)
+        if opt in ("-u", "--timer") :
+            (channel, period) = arg.split(":")
+            timers.append((int(channel,0), float(period)))
+        if opt in ("-j", "--interrupt") :
+            (channel, when) = arg.split(":")
+            interrupts.append((int(channel,0), float(when)))
+        if opt in ("-o", "--console") :
+            console = int(arg,0)
+        if opt in ("-v", "--rom") :
+            (start, end) = arg.split(":")
+            roms.append((int(start,0), int(end,0)))
+        if opt == "--muldiv" :
+            muldiv = True
+        if opt == "--idle" :
+            idleskip = True
+        if opt == "--maxinstr" :
+            max_instructions = int(arg,0)
+        if opt == "--maxcycles" :
+            max_cycles = int(arg,0)
+        if opt == "--timeout" :
+            timeout = float(arg)
+        if opt == "--json" :
+            json_filename = arg
+        if opt in ("-x", "--expecthalt") :
+            expected_halt = int(arg,0)
         if opt in ("-s", "--statistics") :
             statson = True
         if opt in ("-t", "--traceon") :
@@ -199,29 +394,114 @@ if __name__ == "__main__" :
         print ("Cannot open file %s" % filename)
         sys.exit(0)
 
-    emu = F100Emu(adsel=adsel, traceon=traceon, memtraceon=memtraceon)
-    emu.load_memory(filename, file_format)
+    if heatmap_filename != None or profileon or timers or interrupts or console != None or roms or muldiv or idleskip:
+        backend = "python"
+    ## When recording, memory accesses go to the binary trace rather than stdout
+    emu = F100Emu(adsel=adsel, traceon=traceon, memtraceon=memtraceon and record_filename == None,
+                  statistics=statson, backend=backend, timing=F100Timing(clock), idle_loops=idleskip)
+    emu.load_memory(filename, file_format, endianness)
     emu.CPU.reset()
-
-    print_header()
-    st = time.time()
-    while True:
-        emu.instr_count += 1
-        try:
-            emu.CPU.single_step()
-        except F100HaltException as e:
-            print("HALT\n%s" %e)
-            break
-    et = time.time()
+    if record_filename != None:
+        recorder = TraceWriter(record_filename)
+        recorder.attach(emu.CPU, memory=memtraceon)
+    if heatmap_filename != None:
+        profiler = MemoryProfiler(bucket)
+        profiler.attach(emu.CPU)
+    if profileon:
+        instruction_profiler = InstructionProfiler()
+        instruction_profiler.attach(emu.CPU)
+    if console != None or roms:
+        memory_map = MemoryMap()
+        for (start, end) in roms:
+            memory_map.map(start, end, ROM(emu.CPU))
+        if console != None:
+            page = console - console % PAGE_SIZE
+            memory_map.map(page, (console + 1) | (PAGE_SIZE - 1), ConsoleOutput(emu.CPU, console))
+        memory_map.attach(emu.CPU)
+    if muldiv:
+        MultiplyDivideUnit().attach(emu.CPU)
+    if timers or interrupts:
+        ## Event times are in clock periods, converted from microseconds
+        controller = InterruptController()
+        controller.attach(emu.CPU)
+        for (channel, period) in timers:
+            Timer(controller, channel, max(1, int(period * clock / 1000000)))
+        for (channel, when) in interrupts:
+            controller.line(channel).request_at(int(when * clock / 1000000))
+
+    if json_filename == None:
+        print_header()
+    error = None
+    try:
+        (reason, run_time) = emu.run(blockson, max_instructions, max_cycles, timeout)
+    except UserWarning as e:
+        ## Headless runs report errors in the result rather than stopping
+        if json_filename == None:
+            print_flight_recorder(emu.CPU)
+            raise
+        (reason, run_time, error) = ("ERROR", 0.0, str(e))
+    except BaseException:
+        print_flight_recorder(emu.CPU)
+        raise
+    finally:
+        if record_filename != None:
+            recorder.close()
+        if heatmap_filename != None:
+            profiler.detach()
+            profiler.write_file(heatmap_filename, symbols)
+    mips = emu.CPU.instr_count / (1000000 * run_time) if run_time > 0 else 0.0
+
+    if json_filename == None:
+        if reason == "HALT":
+            print("HALT\nCPU Halted with halt number 0x%04X" % emu.CPU.halt_number)
+            if expected_halt != None and emu.CPU.halt_number != expected_halt:
+                print("# Unexpected halt, expected halt number 0x%04X" % expected_halt)
+                print_flight_recorder(emu.CPU)
+        elif reason == "IDLE":
+            print("IDLE\nCPU idle in the loop at 0x%04X with nothing to end it" % emu.CPU.PC)
+            if expected_halt != None:
+                print_flight_recorder(emu.CPU)
+        elif reason == "TIMEOUT":
+            print("TIMEOUT\nRun stopped after %g s at PC 0x%04X" % (timeout, emu.CPU.PC))
+        else:
+            print("%s\nRun stopped at its limit at PC 0x%04X" % (reason, emu.CPU.PC))
 
     if memdumpon:
         hex16dump( emu.CPU.RAM, 32768, memdump_filename)
 
+    if json_filename != None:
+        result = { "program":filename, "reason":reason, "error":error,
+                   "halt_number":emu.CPU.halt_number, "expected_halt":expected_halt,
+                   "instr_count":emu.CPU.instr_count,
+                   "idle_skipped":emu.CPU.idle.skipped if emu.CPU.idle != None else 0,
+                   "cycle_count":emu.CPU.cycle_count,
+                   "simulated_time":emu.CPU.timing.seconds(emu.CPU.cycle_count) if emu.CPU.cycle_count else None,
+                   "read_count":emu.CPU.read_count, "write_count":emu.CPU.write_count,
+                   "run_time":run_time, "mips":mips }
+        if timers or interrupts:
+            result["interrupts_accepted"] = controller.accepted
+        if statson:
+            emu.CPU.collect_execstats()
+            result["execstats"] = dict( (str(i), dict(o.execstats)) for (i, o) in emu.CPU.opcode_table.items())
+        if json_filename == "-":
+            print(json.dumps(result, indent=2))
+        else:
+            with open(json_filename, "w") as f:
+                f.write(json.dumps(result, indent=2) + "\n")
+        halted = reason == "HALT" and (expected_halt == None or emu.CPU.halt_number == expected_halt)
+        sys.exit(0 if halted else 1)
+
     print("# -------------------------------------------------------------------------------------------")
     print("# Program Execution Statistics")
     print("# -------------------------------------------------------------------------------------------")
-    print("#          Instruction Count: %7d" % emu.instr_count)
-#    print("#          Logic cycle count: %7d" % emu.cycle_count)
+    print("#          Instruction Count: %7d" % emu.CPU.instr_count)
+    if emu.CPU.idle != None and emu.CPU.idle.skipped:
+        print("#  Idle instructions skipped: %7d" % emu.CPU.idle.skipped)
+    if emu.CPU.cycle_count:
+        print("#          Clock cycle count: %7d" % emu.CPU.cycle_count)
+        print("#             Simulated time: %.3f ms at %g MHz" % (1000 * emu.CPU.timing.seconds(emu.CPU.cycle_count), clock / 1000000))
+    if timers or interrupts:
+        print("#       Interrupts accepted: %7d" % controller.accepted)
     print("#      Total Memory Accesses: %7d" % (emu.CPU.read_count + emu.CPU.write_count) )
     print("#              Memory Writes: %7d" % emu.CPU.write_count )
     print("#               Memory Reads: %7d" % emu.CPU.read_count )    
@@ -232,12 +512,18 @@ if __name__ == "__main__" :
         print ("# Opcode             Execution")
         print ("# Class    Mnemonic  Count")
         print ("# -------+----------+----------------------------------------------------------------------------")
+        emu.CPU.collect_execstats()
         for i in emu.CPU.opcode_table:
             for fn in sorted(emu.CPU.opcode_table[i].opcode_fn.keys()):
                 print("# F =%2d  | %-8s | %12d" % ( i, fn, emu.CPU.opcode_table[i].execstats[fn]))
-    print("# -------------------------------------------------------------------------------------------")
+    if profileon:
+        instruction_profiler.report(symbols=symbols)
+    if heatmap_filename != None:
+        profiler.report(symbols=symbols, top=10)
+    elif not profileon:
+        print("# -------------------------------------------------------------------------------------------")
     print("# Emulator Performance Statistics")
     print("# -------------------------------------------------------------------------------------------")
-    print("# Run time                  : %10.3f s" % (et - st))
-    print("# Instructions per second   : %10.3f MIPS" % (emu.instr_count/(1000000 * (et-st))))
+    print("# Run time                  : %10.3f s" % run_time)
+    print("# Instructions per second   : %10.3f MIPS" % mips)
     print("# -------------------------------------------------------------------------------------------")
@@ -0,0 +1,276 @@
+## ============================================================================
+## F100IdleLoops.py - Idle loop fast-forwarding for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Idle Loops
+----------
+
+Much of the time of real firmware goes in loops which only wait: an ICZ counting a
+delay down to zero by jumping to itself, or a short run of loads and compares polling
+a flag in memory. IdleLoopDetector recognises the instructions which close such loops
+as they are decoded, and lets F100CPU.run() skip whole iterations at once, updating the
+registers, the counter, and the memory access, instruction and cycle counts exactly as
+if every iteration had been executed. Two kinds of loop are recognised:
+
+* ICZ jumping to itself, with a direct or immediate indirect counter. The iterations
+  left are known from the counter, so the loop is moved on to its last iteration, or
+  as far as the run allows, in one step.
+* A conditional jump on a bit, or a JMP, back to the start of a body of at most
+  MAX_SPAN words made only of loads, arithmetic, compares, logical operations, and
+  shifts and bit operations on registers, without auto-indexing. Such a body writes
+  no memory, so if the registers and flags are the same on two passes in a row through
+  the jump then nothing will change until an event or interrupt, and the loop is idle.
+
+Skipping is off by default and leaves the handlers and run loop untouched; it is
+turned on with F100CPU(idle_loops=True), set_idle_loops(True) or the --idle switch of
+F100Emu. Loops are only skipped inside run() and never past its instruction or cycle limits,
+which with an interrupt controller attached also mark the time the next event is due,
+so the skip is never visible to the program. An idle loop with nothing to end it stops
+the run with the reason "IDLE". Tracing, memory observers, an instruction profiler or
+an until condition need to see every instruction, and turn skipping off, as does
+calling single_step() directly. A device (see F100MemoryMap) may change its registers
+at any time, so loops reading from a device page, or through a pointer when there is a
+memory map, are never skipped.
+'''
+
+from InstructionReg import DECODE_TABLE
+from F100MemoryMap import PAGE_SHIFT
+
+class F100IdleException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class IdleLoopDetector:
+    '''
+    Wraps the handlers of instructions which can close an idle loop so that they skip
+    ahead while horizon allows. horizon is set by F100CPU.run() to a tuple of its
+    instruction and cycle limits, either of which may be None, and is None otherwise.
+    The number of instructions skipped is kept in skipped, and the first and last
+    address of the idle loop last skipped in loop until it is left by the jump.
+    '''
+
+    ## Longest loop, in words, checked for an idle loop
+    MAX_SPAN = 16
+
+    def __init__ (self, CPU):
+        self.CPU = CPU
+        self.horizon = None
+        self.skipped = 0
+        self.loop = None
+
+    def wrap(self, pc, IR, handler):
+        '''
+        Return handler for the instruction IR at pc, wrapped if it can close an idle
+        loop
+        '''
+        if pc is None or pc + 2 > self.CPU.MEMTOP:
+            return handler
+        F = IR.F
+        if F == 7 and ((IR.I == 0 and IR.N != 0) or (IR.I == 1 and IR.P == 0)):
+            return self.countdown(pc, IR, handler)
+        elif F == 0 and IR.T == 0 and IR.S == 2 and not (IR.R == 3 and IR.J >= 2):
+            return self.poll(pc, IR, handler)
+        elif F == 15 and ((IR.I == 0 and IR.N != 0) or (IR.I == 1 and IR.P == 0)):
+            return self.poll(pc, IR, handler)
+        return handler
+
+    def in_ram(self, address):
+        '''
+        Return True if address is in plain RAM, which nothing else can change
+        '''
+        pages = self.CPU.page_table
+        return address <= self.CPU.MEMTOP and (pages is None or pages[address >> PAGE_SHIFT] is None)
+
+    def body_length(self, IR):
+        '''
+        Return the length in words of instruction IR if it can be part of the body of an
+        idle loop, or None
+        '''
+        if IR.F == 0:
+            if IR.T != 0 or IR.S == 2 or IR.R == 3:
+                return None
+            return 1
+        elif not 8 <= IR.F <= 13:
+            return None
+        elif IR.I == 0:
+            return 2 if IR.N == 0 else (1 if self.in_ram(IR.N) else None)
+        elif IR.P == 0:
+            return 2
+        elif IR.R == 0 and self.CPU.page_table is None:
+            return 1
+        return None
+
+    def body(self, start, end):
+        '''
+        Return the list of instruction words from start up to end if they can form the
+        body of an idle loop, or None
+        '''
+        RAM = self.CPU.RAM
+        words = []
+        pc = start
+        while pc < end:
+            IR = DECODE_TABLE[RAM[pc]]
+            length = self.body_length(IR)
+            if length == None or pc + length > end:
+                return None
+            if IR.F != 0 and IR.I == 1 and IR.P == 0 and not self.in_ram(RAM[pc + 1]):
+                return None
+            words.append(IR.content)
+            pc += length
+        return words
+
+    def stuck(self):
+        '''
+        Return True if the CPU is in an idle loop with no event due to end it, so that a
+        run bounded by limits alone would skip the loop until it reaches them
+        '''
+        CPU = self.CPU
+        controller = CPU.interrupts
+        return self.loop != None and self.loop[0] <= CPU.PC <= self.loop[1] and \
+               (controller == None or (controller.requests == 0 and controller.next_due() == None))
+
+    def limit(self, count, cycles, per_iteration):
+        '''
+        Return the number of iterations which can be skipped before reaching the horizon,
+        where count and cycles are those still to be added for the instruction in hand
+        '''
+        (max_instructions, max_cycles) = self.horizon
+        CPU = self.CPU
+        n = None
+        if max_instructions != None:
+            n = (max_instructions - CPU.instr_count) // count
+        if max_cycles != None:
+            c = (max_cycles - CPU.cycle_count - cycles) // per_iteration
+            n = c if n == None else min(n, c)
+        return n
+
+    def skip(self, n, counts):
+        '''
+        Add n iterations of the given counts, a tuple of instructions, cycles, reads,
+        writes and modify writes, to the CPU. The cycles are returned to be passed back
+        from the handler, as for any other instruction.
+        '''
+        CPU = self.CPU
+        CPU.instr_count += n * counts[0]
+        CPU.read_count += n * counts[2]
+        CPU.write_count += n * counts[3]
+        CPU.modify_write_count += n * counts[4]
+        self.skipped += n * counts[0]
+        return n * counts[1]
+
+    def countdown(self, pc, IR, handler):
+        '''
+        Wrap the handler of ICZ at pc, which loops while the counter is not zero if it
+        jumps to itself
+        '''
+        CPU = self.CPU
+        RAM = CPU.RAM
+        words = 2 if IR.I == 0 else 3
+        counter = IR.N if IR.I == 0 else RAM[pc + 1]
+        if RAM[pc + words - 1] != pc or pc <= counter < pc + words or not self.in_ram(counter):
+            return handler
+        word = IR.content
+        cycles = CPU.timing.cycles(word)
+        exec_counts = CPU.exec_counts
+
+        def execute():
+            before = (CPU.read_count, CPU.write_count, CPU.modify_write_count)
+            result = handler()
+            if self.horizon is None or CPU.PC != pc or (words == 3 and RAM[pc + 1] != counter):
+                return result
+            ## Leave the last iteration, which falls through, to be executed
+            n = 0xFFFF - RAM[counter]
+            limit = self.limit(1, cycles + result, cycles)
+            if limit != None:
+                n = min(n, limit)
+            if n > 0:
+                result += self.skip(n, (1, cycles, CPU.read_count - before[0] + 1, CPU.write_count - before[1],
+                                        CPU.modify_write_count - before[2]))
+                CPU.OR = RAM[counter] + n
+                CPU.memory_write(counter, CPU.OR, nostats=True)
+                if exec_counts != None:
+                    exec_counts[word] += n
+            return result
+        return execute
+
+    def poll(self, pc, IR, handler):
+        '''
+        Wrap the handler of the jump at pc, which closes an idle loop if it jumps back to
+        a body with no side effects and leaves the registers unchanged
+        '''
+        CPU = self.CPU
+        RAM = CPU.RAM
+        if IR.F == 15:
+            (target, words) = (IR.N, 1) if IR.I == 0 else (RAM[pc + 1], 2)
+        elif IR.R == 3:
+            if not self.in_ram(RAM[pc + 1]):
+                return handler
+            (target, words) = (RAM[pc + 2], 3)
+        else:
+            (target, words) = (RAM[pc + 1], 2)
+        if not 0 <= pc - target <= self.MAX_SPAN:
+            return handler
+        body = self.body(target, pc)
+        if body == None:
+            return handler
+        code = tuple(RAM[target:pc + words])
+        length = len(body) + 1
+        word = IR.content
+        cycles = CPU.timing.cycles(word)
+        exec_counts = CPU.exec_counts
+        CR = CPU.CR
+        ## Registers and counts at the last time the jump was taken
+        last = [None]
+
+        def execute():
+            result = handler()
+            if self.horizon is None or CPU.PC != target:
+                last[0] = None
+                self.loop = None
+                return result
+            now = (CPU.ACC, CPU.OR, CR.toint(), CPU.instr_count, CPU.cycle_count, CPU.read_count,
+                   CPU.write_count, CPU.modify_write_count)
+            previous = last[0]
+            last[0] = now
+            if previous == None or previous[0:3] != now[0:3] or now[3] - previous[3] != length or \
+               now[6] != previous[6] or tuple(RAM[target:pc + words]) != code:
+                return result
+            counts = tuple(now[i] - previous[i] for i in range(3, 8))
+            n = self.limit(length, cycles + result, counts[1])
+            if n == None:
+                ## Account for the jump, which the exception stops single_step() doing
+                CPU.cycle_count += cycles + result
+                raise F100IdleException("Idle loop at 0x%04X with nothing to end it" % target)
+            self.loop = (target, pc)
+            if n > 0:
+                result += self.skip(n, counts)
+                last[0] = None
+                if exec_counts != None:
+                    for w in body:
+                        if DECODE_TABLE[w].F == 0 and DECODE_TABLE[w].S < 2:
+                            exec_counts[w | (CR.M << 16)] += n
+                        else:
+                            exec_counts[w] += n
+                    exec_counts[word] += n
+            return result
+        return execute
@@ -0,0 +1,208 @@
+## ============================================================================
+## F100Interrupts.py - Program interrupts and timed events for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Interrupts and Timed Events
+---------------------------
+
+InterruptController models the Program Interrupt Request line of section 1.9 of the
+F100-L Hardware Data Book, with the Interface Sets which drive it, and a queue of
+events scheduled by the peripherals. Once attached with F100CPU.set_interrupts(),
+F100CPU.run() stops only when the next event is due, using its instruction or cycle
+limit, so nothing is polled between instructions and translated blocks still run
+at full speed.
+
+Events are held in a heap keyed by the time they are due, which is measured either in
+input clock periods (the CPU cycle_count, the default) or in instructions executed
+(the CPU instr_count). With cycle times and blocks enabled an event can be serviced up
+to one block late, as with the max_cycles limit of run().
+
+Each channel is an InterruptLine and the lines form a daisy chain in the order they
+are created, the first having the highest priority. A request is accepted at the end
+of an instruction when the Interrupt Lock-out (I) is clear, and is withdrawn on
+acceptance as by the Program Interrupt Accept handshake. Further requests on a line
+before then are not queued. The peripherals provided are:
+
+* InterruptLine - an external request line, raised directly or at a scheduled time
+* Timer - a line which requests an interrupt at a fixed period, like the timer on
+  the 4K/16K RAM card
+'''
+
+import heapq
+
+## Units of event times
+CYCLES = "cycles"
+INSTRUCTIONS = "instructions"
+
+class InterruptController:
+    '''
+    Program interrupt lines and event queue, with event times in the given unit, either
+    CYCLES or INSTRUCTIONS
+    '''
+    def __init__ (self, unit=CYCLES):
+        if unit not in (CYCLES, INSTRUCTIONS):
+            raise UserWarning("Unknown event time unit %s" % unit)
+        self.unit = unit
+        ## Heap of events as [due, sequence number, callback], where the sequence number
+        ## keeps events due at the same time in order and a callback of None marks a
+        ## cancelled event
+        self.events = []
+        self.sequence = 0
+        ## Lines in daisy chain order, and the number of them requesting an interrupt
+        self.lines = []
+        self.requests = 0
+        self.accepted = 0
+        self.CPU = None
+
+    def attach(self, CPU):
+        self.CPU = CPU
+        CPU.set_interrupts(self)
+
+    def detach(self):
+        if self.CPU != None:
+            self.CPU.set_interrupts(None)
+
+    def now(self):
+        if self.CPU == None:
+            return 0
+        return self.CPU.cycle_count if self.unit == CYCLES else self.CPU.instr_count
+
+    def line(self, channel):
+        '''
+        Return a new InterruptLine for channel, placed last in the daisy chain
+        '''
+        line = InterruptLine(self, channel)
+        self.lines.append(line)
+        return line
+
+    def schedule(self, delay, callback):
+        '''
+        Call callback with the due time once delay has elapsed, returning the event
+        '''
+        return self.schedule_at(self.now() + delay, callback)
+
+    def schedule_at(self, time, callback):
+        event = [time, self.sequence, callback]
+        self.sequence += 1
+        heapq.heappush(self.events, event)
+        return event
+
+    def cancel(self, event):
+        event[2] = None
+
+    def next_due(self):
+        '''
+        Return the time the next event is due, or None if there are none
+        '''
+        events = self.events
+        while events and events[0][2] is None:
+            heapq.heappop(events)
+        return events[0][0] if events else None
+
+    def waiting(self):
+        '''
+        Return True if a request is being held off by the Interrupt Lock-out
+        '''
+        return self.requests != 0 and self.CPU.CR.I == 1
+
+    def service(self):
+        '''
+        Run the callbacks of all events now due, in order, then accept the highest
+        priority request if the Interrupt Lock-out allows
+        '''
+        now = self.now()
+        events = self.events
+        while events and events[0][0] <= now:
+            (due, sequence, callback) = heapq.heappop(events)
+            if callback is not None:
+                callback(due)
+        if self.requests and self.CPU.CR.I == 0:
+            for line in self.lines:
+                if line.requested:
+                    line.withdraw()
+                    self.accepted += 1
+                    self.CPU.interrupt(line.channel)
+                    break
+
+
+class InterruptLine:
+    '''
+    Program interrupt request line for a single channel 0-63
+    '''
+    def __init__ (self, controller, channel):
+        if not 0 <= channel <= 63:
+            raise UserWarning("Interrupt channel %d out of range 0-63" % channel)
+        self.controller = controller
+        self.channel = channel
+        self.requested = False
+
+    def request(self):
+        if not self.requested:
+            self.requested = True
+            self.controller.requests += 1
+
+    def withdraw(self):
+        if self.requested:
+            self.requested = False
+            self.controller.requests -= 1
+
+    def request_at(self, time):
+        '''
+        Request an interrupt at the given time, returning the event
+        '''
+        return self.controller.schedule_at(time, lambda due : self.request())
+
+
+class Timer:
+    '''
+    Interrupt on channel every period, in the units of the controller, from when it is
+    started. Ticks are counted in ticks, and those which find the previous request not
+    yet accepted in missed.
+    '''
+    def __init__ (self, controller, channel, period, start=True):
+        if period <= 0:
+            raise UserWarning("Timer period must be positive")
+        self.controller = controller
+        self.line = controller.line(channel)
+        self.period = period
+        self.event = None
+        self.ticks = 0
+        self.missed = 0
+        if start:
+            self.start()
+
+    def start(self):
+        if self.event == None:
+            self.event = self.controller.schedule(self.period, self.tick)
+
+    def stop(self):
+        if self.event != None:
+            self.controller.cancel(self.event)
+            self.event = None
+
+    def tick(self, due):
+        self.ticks += 1
+        if self.line.requested:
+            self.missed += 1
+        self.line.request()
+        ## Schedule from the due time rather than now so that the period does not drift
+        self.event = self.controller.schedule_at(due + self.period, self.tick)
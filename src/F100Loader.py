@@ -0,0 +1,157 @@
+## ============================================================================
+## F100Loader.py - Program loaders for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Program Loaders
+---------------
+
+load_image() reads a program in any of the byte oriented formats written by F100Asm
+and copies it into CPU memory as 16 bit words, in place of building a Hex2Bin image
+and transferring it a byte at a time. The whole file is decoded in one pass into a
+byte image, with bytes.fromhex() for the hex formats, which is converted to words with
+array.frombytes() and a single byteswap() if the file's byte order is not that of the
+host, and then stored with one slice assignment to the CPU RAM.
+
+* bin  - raw bytes from address 0
+* hex  - pairs of hex digits from address 0, separated by any white space. Files with
+  other characters between the digits are read as Hex2Bin does, taking every pair of
+  hex digits in turn.
+* ihex - Intel Hex, with record types 0 (data), 1 (end of file), 2 (extended
+  segment address) and 4 (extended linear address), and checksums checked
+
+Words in the load range which the file does not set are cleared to zero.
+
+load_words() stores a program which is already a sequence of 16 bit words in the same
+way.
+'''
+
+from array import array
+import re
+import sys
+
+## Hex2Bin pattern for a pair of hex digits, for hex files not in the usual layout
+HEX_PAIR = re.compile('[0-9,A-F][0-9,A-F]', re.IGNORECASE)
+
+def read_hex(text):
+    '''
+    Return the bytes given by the text of a hex file
+    '''
+    try:
+        return bytes.fromhex(text)
+    except ValueError:
+        return bytes.fromhex("".join(HEX_PAIR.findall(text)))
+
+def read_ihex(text, size):
+    '''
+    Return a bytearray of size bytes holding the data records of the text of an Intel
+    Hex file, dropping any outside it
+    '''
+    image = bytearray(size)
+    base = 0
+    for (line_num, line) in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if line == "":
+            continue
+        try:
+            if line[0] != ":":
+                raise ValueError
+            record = bytes.fromhex(line[1:])
+        except ValueError:
+            raise UserWarning("Bad characters on line %d of Intel Hex file => %s" % (line_num, line))
+        if len(record) < 5 or len(record) != record[0] + 5:
+            raise UserWarning("Line %d of Intel Hex file is the wrong length for its data => %s" % (line_num, line))
+        if sum(record) & 0xFF != 0:
+            raise UserWarning("Checksum error on line %d of Intel Hex file => %s" % (line_num, line))
+        address = (record[1] << 8) | record[2]
+        record_type = record[3]
+        data = record[4:-1]
+        if record_type == 0:
+            start = base + address
+            if start < size:
+                image[start:start + len(data)] = data[0:size - start]
+        elif record_type == 1:
+            break
+        elif record_type in (2, 4) and len(data) != 2:
+            raise UserWarning("Error in extended address record on line %d of Intel Hex file => %s" % (line_num, line))
+        elif record_type == 2:
+            base = ((data[0] << 8 | data[1]) << 4) & 0xF0000
+        elif record_type == 4:
+            base = (data[0] << 8 | data[1]) << 16
+    return image
+
+def read_image(filename, file_format, size):
+    '''
+    Return the first size bytes of the memory image in file filename of the given
+    format, bin, hex or ihex, padded with zeros
+    '''
+    try:
+        if file_format == "bin":
+            with open(filename, "rb") as f:
+                image = f.read(size)
+        elif file_format == "hex":
+            with open(filename, "r") as f:
+                image = read_hex(f.read())[0:size]
+        elif file_format == "ihex":
+            with open(filename, "r") as f:
+                image = read_ihex(f.read(), size)
+        else:
+            raise UserWarning("Unrecognized file format %s - use ihex, hex or bin only" % file_format)
+    except (OSError, ValueError) as e:
+        raise UserWarning("Problem reading file \"%s\": %s" % (filename, e))
+    return image + bytes(size - len(image))
+
+def load_image(CPU, filename, file_format, endianness="little", start=0, end=None):
+    '''
+    Load the words from start to end inclusive, by default the whole of memory, of the
+    program in file filename into CPU memory. The file is in the given format, bin, hex
+    or ihex, with words in little or big endian byte order. Returns the number of words
+    loaded.
+    '''
+    if endianness not in ("little", "big"):
+        raise UserWarning("Unknown endianness %s - use little or big" % endianness)
+    if end == None:
+        end = CPU.MEMTOP
+    if not 0 <= start <= end <= CPU.MEMTOP:
+        raise UserWarning("Load range 0x%04X-0x%04X is outside memory" % (start, end))
+    image = read_image(filename, file_format, 2 * (end + 1))
+    words = array('H')
+    words.frombytes(image[2 * start:])
+    if endianness != sys.byteorder:
+        words.byteswap()
+    return load_words(CPU, words, start)
+
+def load_words(CPU, words, start=0):
+    '''
+    Store the sequence of 16 bit words into CPU memory from address start with a single
+    slice assignment. Returns the number of words loaded.
+    '''
+    if not isinstance(words, array) or words.typecode != 'H':
+        try:
+            words = array('H', words)
+        except (TypeError, OverflowError) as e:
+            raise UserWarning("Cannot load program words: %s" % e)
+    if not 0 <= start <= CPU.MEMTOP or start + len(words) > CPU.MEMTOP + 1:
+        raise UserWarning("Load range 0x%04X-0x%04X is outside memory" % (start, start + len(words) - 1))
+    CPU.RAM[start:start + len(words)] = words
+    ## Drop any code cached from the old contents
+    CPU.invalidate_all()
+    return len(words)
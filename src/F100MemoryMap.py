@@ -0,0 +1,203 @@
+## ============================================================================
+## F100MemoryMap.py - Memory mapped ROM and devices for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Memory Map
+----------
+
+A MemoryMap divides the address space into pages of PAGE_SIZE words, each of which is
+either plain RAM, the default, or handled by a device. Once attached with
+F100CPU.set_memory_map() the CPU memory functions look up the page of each access in
+a flat page table, where plain RAM pages are None and go straight to RAM as before,
+and other pages call the read(address) or write(address, data) method of their
+device with the full address. Without a map the CPU keeps its plain memory functions,
+so there is no cost at all to programs which do not use one.
+
+Translated blocks (see BlockTranslator) still access RAM directly. No block is made
+from code outside RAM or ROM, a block stops before any instruction with a fixed
+address in a device page, and instructions with a pointer check the page of the
+effective address and leave the block to single step if it is not RAM.
+
+The devices provided are:
+
+* ROM - reads come from the CPU memory, which is loaded before the map is attached,
+  and writes are ignored
+* ConsoleOutput - a status and a data register, where each word written to the data
+  register prints its low byte as a character. The default address 0x7EF8 for the
+  status register matches the tube status register of the C core (see F100Native).
+* CycleCounter - the CPU cycle count as two words, low word first
+* RegisterDevice - read and write callbacks, for board specific registers
+
+Any other object with the same read and write methods as MemoryDevice can be mapped.
+'''
+
+import sys
+
+PAGE_SHIFT = 8
+PAGE_SIZE = 1 << PAGE_SHIFT
+
+class MemoryMap:
+    '''
+    Page table for the 64K word address space, in pages, with None for plain RAM and
+    the device for any other page
+    '''
+    def __init__ (self):
+        self.pages = [None] * (0x10000 >> PAGE_SHIFT)
+        self.CPU = None
+
+    def attach(self, CPU):
+        self.CPU = CPU
+        CPU.set_memory_map(self)
+
+    def detach(self):
+        if self.CPU != None:
+            self.CPU.set_memory_map(None)
+
+    def page_range(self, start, end):
+        if start % PAGE_SIZE != 0 or (end + 1) % PAGE_SIZE != 0 or not 0 <= start <= end <= 0xFFFF:
+            raise UserWarning("Memory map range 0x%04X-0x%04X is not a whole number of %d word pages" % (start, end, PAGE_SIZE))
+        return range(start >> PAGE_SHIFT, (end >> PAGE_SHIFT) + 1)
+
+    def map(self, start, end, device):
+        '''
+        Map the pages from start to end inclusive to device, or to plain RAM if device
+        is None. Both ends must fall on page boundaries.
+        '''
+        for page in self.page_range(start, end):
+            self.pages[page] = device
+        if self.CPU != None:
+            ## Translated code may have been made with the old map
+            self.CPU.invalidate_all()
+
+    def unmap(self, start, end):
+        self.map(start, end, None)
+
+    def device(self, address):
+        return self.pages[(address & 0xFFFF) >> PAGE_SHIFT]
+
+    def regions(self):
+        '''
+        Return a list of (start, end, device) for each run of pages mapped to the same
+        device other than plain RAM
+        '''
+        result = []
+        for (page, device) in enumerate(self.pages):
+            if device is None:
+                continue
+            start = page << PAGE_SHIFT
+            if result and result[-1][2] is device and result[-1][1] == start - 1:
+                result[-1] = (result[-1][0], start + PAGE_SIZE - 1, device)
+            else:
+                result.append((start, start + PAGE_SIZE - 1, device))
+        return result
+
+
+class MemoryDevice:
+    '''
+    Base class for memory mapped devices, reading as zero and ignoring writes
+    '''
+    def read(self, address):
+        return 0
+
+    def write(self, address, data):
+        pass
+
+
+class ROM(MemoryDevice):
+    '''
+    Read only memory backed by the CPU memory
+    '''
+    def __init__ (self, CPU):
+        self.RAM = CPU.RAM
+
+    def read(self, address):
+        return self.RAM[address]
+
+
+class ConsoleOutput(MemoryDevice):
+    '''
+    Console output port with a status register at base, which always reads as ready
+    (0x0040), and a data register at base+1. Other addresses in the same pages are
+    left as plain memory in the CPU RAM. Characters written are also kept in output.
+    '''
+    READY = 0x0040
+
+    def __init__ (self, CPU, base=0x7EF8, file=sys.stdout):
+        self.RAM = CPU.RAM
+        self.base = base
+        self.file = file
+        self.output = []
+
+    def read(self, address):
+        if address == self.base:
+            return self.READY
+        elif address == self.base + 1:
+            return 0
+        return self.RAM[address]
+
+    def write(self, address, data):
+        if address == self.base + 1:
+            c = chr(data & 0xFF)
+            self.output.append(c)
+            self.file.write(c)
+        elif address != self.base:
+            self.RAM[address] = data
+
+    def text(self):
+        return "".join(self.output)
+
+
+class CycleCounter(MemoryDevice):
+    '''
+    CPU cycle count as a 32 bit value, with the low word at even addresses and the high
+    word at odd ones. Reading the low word latches the high word so that the two make a
+    consistent count. Writes are ignored.
+    '''
+    def __init__ (self, CPU):
+        self.CPU = CPU
+        self.high = 0
+
+    def read(self, address):
+        if address & 1:
+            return self.high
+        count = self.CPU.cycle_count
+        self.high = (count >> 16) & 0xFFFF
+        return count & 0xFFFF
+
+
+class RegisterDevice(MemoryDevice):
+    '''
+    Device calling read(address) and write(address, data) functions, either of which
+    may be None to read as zero or ignore writes
+    '''
+    def __init__ (self, read=None, write=None):
+        self.read_function = read
+        self.write_function = write
+
+    def read(self, address):
+        if self.read_function == None:
+            return 0
+        return self.read_function(address) & 0xFFFF
+
+    def write(self, address, data):
+        if self.write_function != None:
+            self.write_function(address, data)
@@ -0,0 +1,301 @@
+## ============================================================================
+## F100Native.py - Native C backend for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Native Backend
+--------------
+
+F100NativeCPU runs programs on the C core in csrc/f100.c, loaded through ctypes from
+the shared library built by ::
+
+  cd csrc ; make libf100.so
+
+or from the file named by the F100_NATIVE_LIB environment variable. It presents the
+same registers, memory and run interface as F100CPU so that either can be used by
+the same code, and create_cpu() selects between them with a single argument, falling
+back to F100CPU when the library has not been built.
+
+Differences from F100CPU:
+
+* the C core holds a single CPU, so only one F100NativeCPU should be in use at a time
+* RAM is always the full 64K words of the C core
+* no per-instruction statistics or cycle counts are kept, so collect_execstats() has
+  nothing to report and max_cycles is ignored
+* trace output comes from the C core in its own format
+* there are no program interrupts, so no InterruptController can be attached
+* External Functions are not supported, so no coprocessors can be registered
+* idle loops are always executed in full
+* reads of address 0x7EF8 always return 0x0040, the tube status register
+'''
+
+from F100CPU import F100CPU
+from F100Snapshot import F100Snapshot
+from InstructionReg import DECODE_TABLE
+from F100_Opcodes.F100_Opcode import F100HaltException
+from array import array
+import ctypes
+import os.path
+
+class _Instr(ctypes.Structure):
+    _fields_ = [ ("WORD", ctypes.c_uint16),
+                 ("B", ctypes.c_uint8), ("F", ctypes.c_uint8), ("I", ctypes.c_uint8),
+                 ("J", ctypes.c_uint8), ("P", ctypes.c_uint8), ("R", ctypes.c_uint8),
+                 ("S", ctypes.c_uint8), ("T", ctypes.c_uint8),
+                 ("N", ctypes.c_uint16) ]
+
+class _Stats(ctypes.Structure):
+    _fields_ = [ ("instrs", ctypes.c_uint32),
+                 ("mwrites", ctypes.c_uint32),
+                 ("mreads", ctypes.c_uint32) ]
+
+class _CPU(ctypes.Structure):
+    _fields_ = [ ("mem", ctypes.POINTER(ctypes.c_uint16)),
+                 ("acc", ctypes.c_uint16), ("or_", ctypes.c_uint16), ("pc", ctypes.c_uint16),
+                 ("I", ctypes.c_bool), ("Z", ctypes.c_bool), ("V", ctypes.c_bool),
+                 ("S", ctypes.c_bool), ("C", ctypes.c_bool), ("M", ctypes.c_bool),
+                 ("F", ctypes.c_bool),
+                 ("ir", _Instr),
+                 ("stats", _Stats) ]
+
+## Size of the C core memory in words
+NATIVE_MEMSZ = 65536
+
+_library = None
+_libc = None
+
+def load_library():
+    '''
+    Return the C core shared library, or None if it cannot be found or loaded
+    '''
+    global _library
+    if _library == None:
+        path = os.environ.get("F100_NATIVE_LIB",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                           "..", "csrc", "libf100.so"))
+        try:
+            lib = ctypes.CDLL(path)
+        except OSError:
+            return None
+        lib.f100_init.restype = ctypes.POINTER(_CPU)
+        lib.f100_init.argtypes = [ ctypes.c_bool, ctypes.c_bool, ctypes.c_bool ]
+        lib.f100_reset.restype = None
+        lib.f100_reset.argtypes = [ ctypes.c_bool ]
+        lib.f100_exec.restype = ctypes.c_int32
+        lib.f100_exec.argtypes = [ ctypes.c_int ]
+        _library = lib
+    return _library
+
+def load_libc():
+    '''
+    Return the C library, loaded on first use as it is only needed with tracing
+    '''
+    global _libc
+    if _libc == None:
+        _libc = ctypes.CDLL(None)
+    return _libc
+
+def native_available():
+    return load_library() != None
+
+def _flag(name):
+    return property(lambda self : int(getattr(self.cpu, name)),
+                    lambda self, value : setattr(self.cpu, name, bool(value & 1)))
+
+class NativeConditionReg:
+    '''
+    Condition register view of the flags held in the C core
+    '''
+    I = _flag("I")
+    Z = _flag("Z")
+    V = _flag("V")
+    S = _flag("S")
+    C = _flag("C")
+    M = _flag("M")
+    F = _flag("F")
+
+    def __init__ (self, cpu):
+        self.cpu = cpu
+
+    def reset(self):
+        self.fromint(0)
+
+    def fromint(self, val):
+        ( self.I, self.Z, self.V, self.S, self.C, self.M, self.F ) = [ (val >> i) & 1 for i in range(0, 7) ]
+
+    def toint(self):
+        return self.F << 6 | self.M << 5 | self.C << 4 | self.S << 3 | self.V << 2 | self.Z << 1 | self.I
+
+    def unpack(self):
+        return ( self.F, self.M, self.C, self.S, self.V, self.Z, self.I )
+
+    def tostring(self):
+        return "F=%d M=%d C=%d S=%d V=%d Z=%d I=%d" % self.unpack()
+
+
+class F100NativeCPU:
+    def __init__ (self, adsel=1, traceon=False, memtraceon=False, **kwargs):
+        lib = load_library()
+        if lib == None:
+            raise UserWarning("Native F100 library not found, build it with 'make libf100.so' in csrc")
+        self.lib = lib
+        self.cpu = lib.f100_init(traceon, memtraceon, False).contents
+        self.RAM = memoryview((ctypes.c_uint16 * NATIVE_MEMSZ).from_address(
+            ctypes.addressof(self.cpu.mem.contents))).cast('B').cast('H')
+        self.RAM[:] = memoryview(bytes(2*NATIVE_MEMSZ)).cast('H')
+        self.MEMTOP = NATIVE_MEMSZ - 1
+        self.CR = NativeConditionReg(self.cpu)
+        self.adsel = adsel
+        self.traceon = traceon
+        self.memtraceon = memtraceon
+        self.cycle_count = 0
+        self.modify_write_count = 0
+        self.opcode_table = dict()
+        self.flight = None
+        self.idle = None
+        self.reset()
+
+    PC = property(lambda self : self.cpu.pc, lambda self, v : setattr(self.cpu, "pc", v & 0xFFFF))
+    ACC = property(lambda self : self.cpu.acc, lambda self, v : setattr(self.cpu, "acc", v & 0xFFFF))
+    OR = property(lambda self : self.cpu.or_, lambda self, v : setattr(self.cpu, "or_", v & 0xFFFF))
+    IR = property(lambda self : DECODE_TABLE[self.cpu.ir.WORD])
+    instr_count = property(lambda self : self.cpu.stats.instrs)
+    read_count = property(lambda self : self.cpu.stats.mreads)
+    write_count = property(lambda self : self.cpu.stats.mwrites)
+
+    @property
+    def halt_number(self):
+        IR = self.cpu.ir
+        return IR.WORD & 0x03FF if IR.F == 0 and IR.T == 1 else None
+
+    def reset(self):
+        self.lib.f100_reset(self.adsel == 1)
+        self.cpu.ir.WORD = 0
+        self.cpu.ir.F = 0
+        self.cpu.ir.T = 0
+        self.CR.reset()
+
+    def memory_read(self, address, nostats=False, notrace=False):
+        a = address & 0xFFFF
+        if nostats == False:
+            self.cpu.stats.mreads += 1
+        return self.RAM[a]
+
+    def memory_write(self, address, data, modify=False, nostats=False, notrace=False):
+        a = address & 0xFFFF
+        if nostats == False:
+            self.cpu.stats.mwrites += 1
+        self.RAM[a] = data & 0xFFFF
+
+    def invalidate_all(self):
+        pass
+
+    def snapshot(self):
+        '''
+        Return an F100Snapshot of the C core state, which can only be restored to an
+        F100NativeCPU
+        '''
+        ram = array('H')
+        ram.frombytes(self.RAM.cast('B'))
+        return F100Snapshot(RAM=ram, adsel=self.adsel, PC=self.PC, ACC=self.ACC, OR=self.OR,
+                            CR=self.CR.toint(), IR=self.cpu.ir.WORD,
+                            halt_number=self.halt_number, cycle_count=0,
+                            instr_count=self.instr_count, read_count=self.read_count,
+                            write_count=self.write_count, modify_write_count=0,
+                            RAM_writeset=frozenset(), exec_counts=None)
+
+    def restore(self, snapshot):
+        if len(snapshot.RAM) != NATIVE_MEMSZ:
+            raise UserWarning("Cannot restore a snapshot with a different memory size")
+        self.RAM[:] = memoryview(snapshot.RAM)
+        self.adsel = snapshot.adsel
+        self.PC = snapshot.PC
+        self.ACC = snapshot.ACC
+        self.OR = snapshot.OR
+        self.CR.fromint(snapshot.CR)
+        IR = DECODE_TABLE[snapshot.IR]
+        ir = self.cpu.ir
+        ( ir.WORD, ir.F, ir.I, ir.T, ir.R, ir.S, ir.J, ir.B, ir.P, ir.N ) = IR[0:10]
+        stats = self.cpu.stats
+        ( stats.instrs, stats.mreads, stats.mwrites ) = ( snapshot.instr_count,
+                                                          snapshot.read_count,
+                                                          snapshot.write_count )
+
+    def collect_execstats(self):
+        pass
+
+    def execute(self, max_instructions):
+        '''
+        Run the C core for at most max_instructions (0 for no limit), flushing any trace
+        output it produces, and return True if it halted
+        '''
+        self.lib.f100_exec(max_instructions)
+        if self.traceon or self.memtraceon:
+            ## The C stdio buffers are separate from Python's
+            load_libc().fflush(None)
+        return self.halt_number != None
+
+    def single_step(self):
+        if self.execute(1):
+            raise F100HaltException("CPU Halted with halt number 0x%04X" % self.halt_number )
+
+    def run(self, max_instructions=None, until=None, max_cycles=None, blocks=False):
+        '''
+        Run the CPU as F100CPU.run(). Without an until condition the whole run stays in
+        the C core, otherwise it is single stepped to test the condition.
+        '''
+        if until == None:
+            if max_instructions == None:
+                self.execute(0)
+                return "HALT"
+            remaining = max_instructions
+            while remaining > 0:
+                chunk = min(remaining, 0x40000000)
+                if self.execute(chunk):
+                    return "HALT"
+                remaining -= chunk
+            return "MAX_INSTRUCTIONS"
+
+        if callable(until):
+            check = until
+        else:
+            address = until & 0x7FFF
+            check = lambda cpu : cpu.PC == address
+        limit = None if max_instructions == None else self.instr_count + max_instructions
+        while limit == None or self.instr_count < limit:
+            if self.execute(1):
+                return "HALT"
+            if check(self):
+                return "UNTIL"
+        return "MAX_INSTRUCTIONS"
+
+
+def create_cpu(backend="python", **kwargs):
+    '''
+    Return a CPU using the given backend, "python" for F100CPU or "native" for
+    F100NativeCPU. The native backend falls back to F100CPU if its library is not
+    available. Keyword arguments are passed on to the CPU constructor.
+    '''
+    if backend == "native" and native_available():
+        return F100NativeCPU(**kwargs)
+    elif backend not in ("python", "native"):
+        raise UserWarning("Unknown CPU backend %s" % backend)
+    return F100CPU(**kwargs)
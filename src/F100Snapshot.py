@@ -0,0 +1,120 @@
+## ============================================================================
+## F100Snapshot.py - Saved machine state for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Machine Snapshots
+-----------------
+
+F100CPU.snapshot() captures the state of the CPU itself: RAM, the PC, ACC, OR,
+condition and instruction registers, the halt number and all of the execution
+counters. The state of anything attached to it, such as the flight recorder,
+profilers, interrupt controller, idle loop detector or memory mapped devices, is not
+included; see F100CPU.snapshot() for the full list. F100CPU.restore() puts it back, which can be done any number of times from
+the same snapshot, e.g. to rerun a program many times from a warm state without
+repeating its initialisation code.
+
+Restoring compares RAM against the snapshot a page at a time and only copies back the
+pages which have changed, dropping any decoded or translated code in them. Snapshots
+can be saved to and loaded from a compact binary file ::
+
+  snap = cpu.snapshot()
+  snap.save("warm.snap")
+  ...
+  cpu.restore(F100Snapshot.load("warm.snap"))
+
+The file holds a fixed header followed by the zlib compressed RAM image, the set of
+written addresses and the per-instruction execution counts (if gathered), all as little
+endian values.
+'''
+
+from array import array
+import struct
+import sys
+import zlib
+
+class F100Snapshot:
+
+    MAGIC = b"F100SNP1"
+    ## magic, ramsize, adsel, PC, ACC, OR, CR, IR, halt_number (-1 for none),
+    ## cycle_count, instr_count, read_count, write_count, modify_write_count,
+    ## writeset size, execution counts present
+    HEADER = struct.Struct("<8sIBHHIBHiQQQQQIB")
+
+    __slots__ = ( "RAM", "adsel", "PC", "ACC", "OR", "CR", "IR", "halt_number",
+                  "cycle_count", "instr_count", "read_count", "write_count",
+                  "modify_write_count", "RAM_writeset", "exec_counts" )
+
+    def __init__ (self, **state):
+        for name in self.__slots__:
+            setattr(self, name, state[name])
+
+    def tobytes(self):
+        '''
+        Return the snapshot in its binary file format
+        '''
+        ram = array('H', self.RAM)
+        writeset = array('H', sorted(self.RAM_writeset))
+        counts = array('Q', self.exec_counts if self.exec_counts != None else [])
+        if sys.byteorder == "big":
+            for a in (ram, writeset, counts):
+                a.byteswap()
+        header = self.HEADER.pack(self.MAGIC, len(ram), self.adsel, self.PC, self.ACC, self.OR,
+                                  self.CR, self.IR,
+                                  -1 if self.halt_number == None else self.halt_number,
+                                  self.cycle_count, self.instr_count, self.read_count,
+                                  self.write_count, self.modify_write_count,
+                                  len(writeset), self.exec_counts != None)
+        return header + zlib.compress(ram.tobytes() + writeset.tobytes() + counts.tobytes())
+
+    @classmethod
+    def frombytes(cls, data):
+        '''
+        Return a new snapshot from data in the binary file format
+        '''
+        if data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise UserWarning("Not an F100 snapshot")
+        ( magic, ramsize, adsel, PC, ACC, OR, CR, IR, halt_number, cycle_count,
+          instr_count, read_count, write_count, modify_write_count, nwrites,
+          hascounts ) = cls.HEADER.unpack_from(data)
+        payload = zlib.decompress(data[cls.HEADER.size:])
+        ram = array('H', payload[:2*ramsize])
+        writeset = array('H', payload[2*ramsize:2*(ramsize+nwrites)])
+        counts = array('Q', payload[2*(ramsize+nwrites):])
+        if sys.byteorder == "big":
+            for a in (ram, writeset, counts):
+                a.byteswap()
+        return cls(RAM=ram, adsel=adsel, PC=PC, ACC=ACC, OR=OR, CR=CR, IR=IR,
+                   halt_number=None if halt_number < 0 else halt_number,
+                   cycle_count=cycle_count, instr_count=instr_count,
+                   read_count=read_count, write_count=write_count,
+                   modify_write_count=modify_write_count,
+                   RAM_writeset=frozenset(writeset),
+                   exec_counts=counts.tolist() if hascounts else None)
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            f.write(self.tobytes())
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as f:
+            return cls.frombytes(f.read())
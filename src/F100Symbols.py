@@ -0,0 +1,131 @@
+## ============================================================================
+## F100Symbols.py - Assembler symbol files for the F100-L tools
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Symbol Files
+------------
+
+F100Asm -y/--symbolfile writes the labels and .EQU values of a program to a text
+file which the emulator profilers read to put names to addresses. After a comment
+line identifying the file each line holds a symbol name, its value in hex and its
+kind, LABEL or EQU ::
+
+  # F100 symbol file
+  INIT                             0x0800 LABEL
+  TMPVAR                           0x0032 EQU
+
+Values are truncated to 16 bits. Symbols whose values cannot be evaluated are left
+out.
+'''
+
+import bisect
+
+LABEL = "LABEL"
+EQU = "EQU"
+
+HEADER = "# F100 symbol file"
+
+def write_symbol_file(filename, symbols):
+    '''
+    Write a symbol file from an iterable of (name, value, kind) tuples
+    '''
+    with open(filename, "w") as f:
+        f.write(HEADER + "\n")
+        for (name, value, kind) in sorted(symbols, key=lambda s : (s[1] & 0xFFFF, s[0])):
+            f.write("%-32s 0x%04X %s\n" % (name, value & 0xFFFF, kind))
+
+def read_symbol_file(filename):
+    '''
+    Return a SymbolMap of the symbols in a file written by write_symbol_file()
+    '''
+    symbols = []
+    with open(filename) as f:
+        if f.readline().strip() != HEADER:
+            raise UserWarning("%s is not an F100 symbol file" % filename)
+        for (lineno, line) in enumerate(f, 2):
+            fields = line.split()
+            if len(fields) == 0 or fields[0].startswith("#"):
+                continue
+            if len(fields) != 3 or fields[2] not in (LABEL, EQU):
+                raise UserWarning("Syntax error in symbol file %s line %d" % (filename, lineno))
+            symbols.append((fields[0], int(fields[1], 16), fields[2]))
+    return SymbolMap(symbols)
+
+
+class SymbolMap:
+    '''
+    Symbols of a program looked up by value. names() returns every symbol with exactly
+    the value given, labels first, and locate() finds the nearest label at or below an
+    address.
+    '''
+    def __init__ (self, symbols=()):
+        self.symbols = []
+        self.by_value = dict()
+        self.label_values = []
+        self.label_names = []
+        for (name, value, kind) in symbols:
+            self.add(name, value, kind)
+
+    def add(self, name, value, kind=LABEL):
+        value &= 0xFFFF
+        self.symbols.append((name, value, kind))
+        ## Kept sorted with labels ahead of .EQU values
+        names = self.by_value.setdefault(value, [])
+        names.append((kind != LABEL, name))
+        names.sort()
+        if kind == LABEL:
+            i = bisect.bisect_right(self.label_values, value)
+            self.label_values.insert(i, value)
+            self.label_names.insert(i, name)
+
+    def __len__ (self):
+        return len(self.symbols)
+
+    def names(self, address):
+        return [ n[1] for n in self.by_value.get(address & 0xFFFF, ()) ]
+
+    def labels(self):
+        '''
+        Return the labels as a list of (address, name) in address order
+        '''
+        return list(zip(self.label_values, self.label_names))
+
+    def locate(self, address):
+        '''
+        Return (name, offset) for the nearest label at or below address, or (None,
+        address) if there is none
+        '''
+        i = bisect.bisect_right(self.label_values, address & 0xFFFF)
+        if i == 0:
+            return (None, address & 0xFFFF)
+        return (self.label_names[i-1], (address & 0xFFFF) - self.label_values[i-1])
+
+    def describe(self, address):
+        '''
+        Return the names of the symbols at address joined by '/', or failing that the
+        nearest label below it plus an offset, or '' if there is no label below it
+        '''
+        names = self.names(address)
+        if names:
+            return "/".join(names)
+        (name, offset) = self.locate(address)
+        return "" if name == None else "%s+0x%X" % (name, offset)
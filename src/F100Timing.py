@@ -0,0 +1,193 @@
+## ============================================================================
+## F100Timing.py - Instruction timing model for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Instruction Timing
+------------------
+
+F100Timing gives the execution time of each instruction following Table 1.1 of the
+F100-L Hardware Data Book, using the I/O Bus cycle times of section 1.8:
+
+=====================  ==========================================
+Read access     Ra     (3L/2 + 277 + Ac)*
+Read cycle      Rc     (3L/2 + 525 + Ac)*
+Write cycle     Wc     (3L/2 + 182)* + (3L/2 + 243 + Wt)*
+Read-modify-write M    (3L/2 + 277 + Ac)* + (3L/2 + 243 + Wt)*
+=====================  ==========================================
+
+where L, the logic cycle, is twice the input clock period, Ac and Wt are the memory
+access and write times in ns and * rounds up to the next multiple of L/2. Since every
+time is then a whole number of input clock periods, that is the unit used for all
+cycle counts. The data book leaves the clock rate to the part's specification, so it
+is a parameter here. The default memory times are those of the 4K/16K RAM card in
+section 3.3.1. Program memory accesses (Ra1, Rc1) may be given a different access
+time from data accesses (Ra2, Rc2), for example for a system running from ROM.
+
+Times depend only on the instruction word, except that shifts also depend on the M
+flag, so the CPU looks them up once when it decodes an instruction and translated
+blocks fold them into constants. Instructions not covered by the table, the External
+Functions, are charged a single program read access.
+'''
+
+from InstructionReg import DECODE_TABLE
+import math
+
+## Instruction time tables, shared by all timing models with the same parameters
+TABLES = dict()
+
+class F100Timing:
+    '''
+    Timing model for an F100-L with the given input clock rate in Hz and memory access
+    and write times in ns. cycles() returns instruction times in input clock periods.
+    '''
+    def __init__ (self, clock=8000000, access=280, write=185, program_access=None):
+        if clock <= 0:
+            raise UserWarning("Clock rate must be positive")
+        self.clock = clock
+        self.access = access
+        self.write = write
+        self.program_access = access if program_access == None else program_access
+        T = 1e9 / clock
+        ## Round a time in ns up to whole clock periods, allowing for float error
+        periods = lambda ns : int(math.ceil(ns / T - 1e-6))
+        self.L = 2
+        self.Ra1 = periods(3*T + 277 + self.program_access)
+        self.Rc1 = periods(3*T + 525 + self.program_access)
+        self.Ra2 = periods(3*T + 277 + access)
+        self.Rc2 = periods(3*T + 525 + access)
+        self.Wc = periods(3*T + 182) + periods(3*T + 243 + write)
+        self.M = periods(3*T + 277 + access) + periods(3*T + 243 + write)
+        ## Times are worked out on first use and kept, indexed by word | (M << 16). The
+        ## extra time for each shift word executed double length is filled in at the
+        ## same time, so that it is ready by the time the word has been decoded. Both
+        ## depend only on the parameters, so are shared with any other model using them.
+        key = (clock, access, write, self.program_access)
+        if key not in TABLES:
+            TABLES[key] = ([None] * 0x20000, [0] * 0x10000)
+        (self.table, self.double_extra) = TABLES[key]
+
+    def cycles(self, word, M=0):
+        '''
+        Return the time for instruction word executed with the given M flag
+        '''
+        i = word | (M << 16)
+        c = self.table[i]
+        if c is None:
+            IR = DECODE_TABLE[word]
+            c = self.table[i] = self.instruction_time(IR, M)
+            if IR.F == 0 and IR.T == 0 and IR.S < 2:
+                self.double_extra[word] = self.instruction_time(IR, 1) - self.instruction_time(IR, 0)
+        return c
+
+    def double_cycles(self, word):
+        '''
+        Return the extra time for shift word when executed double length
+        '''
+        self.cycles(word)
+        return self.double_extra[word]
+
+    def seconds(self, cycles):
+        return cycles / self.clock
+
+    def interrupt_time(self):
+        '''
+        Time to accept a program interrupt, which stores the link as a direct CAL does
+        with the vector read from the Interface Set in place of the instruction fetch
+        '''
+        return self.Ra1 + self.M + 2*self.Wc + 10*self.L
+
+    def register_time(self, IR):
+        '''
+        Extra time for a bit or single length shift operation on the register selected
+        by R: note (i) to part 1 of the table
+        '''
+        L = self.L
+        if IR.R == 3:
+            return self.Rc1 + self.M
+        elif IR.R == 1:
+            return 2*L
+        return L
+
+    def instruction_time(self, IR, M=0):
+        L = self.L
+        F = IR.F
+        if F == 0:
+            if IR.T == 1:
+                ## Halt
+                return self.Ra1 + 20*L
+            elif IR.T != 0:
+                ## External Function, as required by the device
+                return self.Ra1
+            elif IR.S == 2:
+                ## Jump on bit, possibly then setting or clearing it
+                return self.Ra1 + self.Rc1 + 18*L + self.register_time(IR)
+            elif IR.S == 3:
+                ## Set or clear bit
+                return self.Ra1 + 18*L + self.register_time(IR)
+            elif M == 0:
+                ## Single length shift
+                return self.Ra1 + (IR.B + 3)*L + self.register_time(IR)
+            ## Double length shifts of B or B+16 places, which come to the same
+            ## formula in terms of the full five bit shift distance
+            distance = ((IR.J << 4) | IR.B) & 0x1F
+            if IR.R == 3:
+                return self.Ra1 + self.Rc1 + self.M + (distance + 3)*L
+            elif IR.R == 1:
+                return self.Ra1 + (distance + 5)*L
+            ## Accumulator and Operand Register, note (viii)
+            return self.Ra1 + (distance + 4)*L
+        elif F == 1:
+            return self.Ra1 + 20*L
+        elif F == 2:
+            if IR.I == 0:
+                return self.Ra1 + self.M + 2*self.Wc + 10*L
+            return self.Ra1 + self.Rc1 + self.M + 2*self.Wc + 19*L
+        elif F == 3:
+            if IR.I == 0:
+                return self.Ra1 + 2*self.Rc2 + self.M + 18*L
+            return self.Ra1 + self.Rc2 + self.M + 18*L
+        elif F == 15:
+            if IR.I == 0:
+                return self.Ra1 + 3*L
+            elif IR.P == 0:
+                return self.Ra1 + self.Rc1 + 2*L
+            elif IR.R in (1, 3):
+                return self.Ra1 + self.M + 19*L
+            return self.Ra1 + self.M + 4*L
+        elif F == 14:
+            return 0
+
+        if F in (4, 5, 6):
+            time = self.Ra1 + self.M + 18*L
+        elif F == 7:
+            time = self.Ra1 + self.Rc1 + self.M + 18*L
+        else:
+            time = self.Ra1 + self.Ra2 + 18*L
+        ## Addressing mode, note (vii) to part 2 of the table
+        if IR.I == 1:
+            if IR.P == 0:
+                time += self.Rc1
+            elif IR.R in (1, 3):
+                time += self.M + 16*L
+            else:
+                time += self.M + L
+        return time
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+## ============================================================================
+## F100Trace.py - Binary execution traces for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+USAGE:
+
+  F100Trace reads a binary trace file written by F100Emu -r/--record and either
+  prints it in the same text format as the -t/--traceon switch or summarises it.
+
+  python3 F100Trace.py [switches] <tracefile>
+
+OPTIONAL SWITCHES ::
+
+  -p --pc       <lo>[:<hi>]      only show instructions with PC in this range
+
+  -i --instr    <mnemonic>       only show instructions with this mnemonic
+
+  -m --memory                    also show all recorded memory accesses, which
+                                 are not filtered by -p or -i
+
+  -s --summary                   print a summary instead of the trace: record
+                                 counts, the most executed instructions and
+                                 addresses and the memory access counts
+
+  -h --help                      print this help message
+
+EXAMPLES ::
+
+  python3 F100Emu.py -f pi-spigot.hex -g hex -r pi.trc
+  python3 F100Trace.py -s pi.trc
+  python3 F100Trace.py -p 0x0900:0x09FF pi.trc
+
+FILE FORMAT ::
+
+  The file starts with the 8 byte magic string F100TRC1 and is followed by fixed size
+  records of nine little endian 16 bit words. The low byte of the first word gives
+  the record kind:
+
+  INSTR  0  high byte CR, then PC, IR, ACC, OR, LSP and the words at LSP-2, LSP-1 and
+            LSP, all taken after the opcode fetch and before execution
+  LOAD   1  then address and data of a memory read, remaining words zero
+  STORE  2  then address and data of a memory write, remaining words zero
+
+  Memory records are only written when the trace is made with memory tracing on,
+  and appear in the order the accesses are made.
+'''
+
+from MemoryObserver import MemoryObserver
+from F100CPU import F100CPU
+from F100_Opcodes.OpcodeF0_Shift import OpcodeF0_Shift
+from InstructionReg import DECODE_TABLE
+from collections import namedtuple, Counter
+from array import array
+import getopt
+import sys
+
+MAGIC = b"F100TRC1"
+RECORD_WORDS = 9
+
+INSTR = 0
+LOAD = 1
+STORE = 2
+
+TraceRecord = namedtuple("TraceRecord", "kind CR PC IR ACC OR LSP S2 S1 S0")
+
+class TraceWriter(MemoryObserver):
+    '''
+    Write a binary trace of a CPU to filename. Records are packed into a preallocated
+    buffer which is written out whenever it fills, and on close().
+
+    attach() sets the CPU tracing to this writer in place of the text trace, and with
+    memory=True also records every memory access. The link stack words are read
+    directly from RAM so, unlike the text trace, they are not counted as accesses.
+    '''
+    def __init__ (self, filename, buffer_records=4096):
+        self.file = open(filename, "wb")
+        self.file.write(MAGIC)
+        self.buffer = array('H')
+        self.limit = buffer_records * RECORD_WORDS
+        self.CPU = None
+        self.memory = False
+
+    def attach(self, CPU, memory=False):
+        self.CPU = CPU
+        self.memory = memory
+        RAM = CPU.RAM
+        append = self.buffer.extend
+        def trace():
+            CR = CPU.CR
+            LSP = RAM[0]
+            append(( CR.toint() << 8, (CPU.PC-1) & 0xFFFF, CPU.IR.content, CPU.ACC & 0xFFFF,
+                     CPU.OR & 0xFFFF, LSP, RAM[(LSP-2) % 0x7FFF], RAM[(LSP-1) % 0x7FFF],
+                     RAM[LSP % 0x7FFF] ))
+            if len(self.buffer) >= self.limit:
+                self.flush()
+        CPU.trace = trace
+        CPU.traceon = True
+        if memory:
+            CPU.add_observer(self)
+
+    def detach(self):
+        if self.CPU != None:
+            self.CPU.trace = self.CPU.print_machine_state
+            self.CPU.traceon = False
+            if self.memory:
+                self.CPU.remove_observer(self)
+            self.CPU = None
+
+    def read(self, address, data):
+        self.buffer.extend(( LOAD, address, data, 0, 0, 0, 0, 0, 0 ))
+
+    def write(self, address, data):
+        self.buffer.extend(( STORE, address, data, 0, 0, 0, 0, 0, 0 ))
+
+    def flush(self):
+        if sys.byteorder == "big":
+            self.buffer.byteswap()
+        self.buffer.tofile(self.file)
+        del self.buffer[:]
+
+    def close(self):
+        self.detach()
+        self.flush()
+        self.file.close()
+
+
+class TraceReader:
+    '''
+    Read the records of a binary trace file, returning TraceRecords from records() or
+    iterating over the reader itself. Memory records hold the address in PC and the
+    data in IR.
+    '''
+    def __init__ (self, filename, chunk_records=65536):
+        self.filename = filename
+        self.chunk = chunk_records * RECORD_WORDS * 2
+
+    def __iter__ (self):
+        return self.records()
+
+    def records(self):
+        with open(self.filename, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise UserWarning("%s is not an F100 trace file" % self.filename)
+            while True:
+                data = f.read(self.chunk)
+                if not data:
+                    break
+                words = array('H', data[:len(data) - len(data) % (2*RECORD_WORDS)])
+                if sys.byteorder == "big":
+                    words.byteswap()
+                for i in range(0, len(words), RECORD_WORDS):
+                    w = words[i]
+                    yield TraceRecord(w & 0xFF, w >> 8, *words[i+1:i+RECORD_WORDS])
+
+    def instructions(self):
+        return ( r for r in self.records() if r.kind == INSTR )
+
+
+def render(r):
+    '''
+    Return a record as a line of text in the format of the emulator trace output
+    '''
+    if r.kind == INSTR:
+        flags = tuple((r.CR >> i) & 1 for i in range(6, -1, -1))
+        return ("%04X  : %04X : %04X %04X : %d%d%d%d%d%d%d : %04X  %04X   %04X   %04X  : %s" %
+                ((r.PC, r.IR, r.ACC, r.OR) + flags + (r.LSP, r.S2, r.S1, r.S0, DECODE_TABLE[r.IR].name)))
+    return ("%s : addr=0x%04X (%6d) data=0x%04X (%6d)" %
+            ("LOAD " if r.kind == LOAD else "STORE", r.PC, r.PC, r.IR, r.IR))
+
+def mnemonic(CPU, word, M):
+    '''
+    Return the mnemonic of instruction word executed with flag M, from the disassembler
+    of the CPU opcode class handling it, which tells apart the F=0 instructions and the
+    single and double length shifts
+    '''
+    IR = DECODE_TABLE[word]
+    handler = CPU.dispatch_table[word >> 6]
+    if handler == None:
+        return IR.name
+    elif isinstance(handler.__self__, OpcodeF0_Shift):
+        return handler.__self__.disassemble(IR, M=M)
+    return handler.__self__.disassemble(IR)
+
+def summarise(reader):
+    '''
+    Return a dictionary of trace statistics: record counts by kind, and Counters of
+    executed instruction mnemonics and PCs and of memory addresses read and written
+    '''
+    counts = Counter()
+    mnemonics = Counter()
+    pcs = Counter()
+    reads = Counter()
+    writes = Counter()
+    for r in reader.records():
+        counts[r.kind] += 1
+        if r.kind == INSTR:
+            pcs[r.PC] += 1
+            mnemonics[(r.IR, (r.CR >> 5) & 1)] += 1
+        elif r.kind == LOAD:
+            reads[r.PC] += 1
+        else:
+            writes[r.PC] += 1
+    ## Mnemonics are counted by instruction word and M flag, which selects double length
+    ## shifts, and merged by name at the end using the opcode disassemblers
+    names = Counter()
+    if mnemonics:
+        CPU = F100CPU(statistics=False)
+    for ((word, M), n) in mnemonics.items():
+        names[mnemonic(CPU, word, M)] += n
+    return { "instructions":counts[INSTR], "loads":counts[LOAD], "stores":counts[STORE],
+             "mnemonics":names, "pcs":pcs, "reads":reads, "writes":writes }
+
+def usage():
+    print( __doc__ )
+    sys.exit(0)
+
+if __name__ == "__main__" :
+    pc_range = None
+    instr = None
+    memory = False
+    summary = False
+    try:
+        opts, args = getopt.getopt( sys.argv[1:], "hi:mp:s", ["help","instr=","memory","pc=","summary"])
+    except getopt.GetoptError as  err:
+        print(err)
+        usage()
+
+    for opt, arg in opts:
+        if opt in ( "-p", "--pc" ) :
+            lims = [ int(a,0) for a in arg.split(":") ]
+            pc_range = (lims[0], lims[-1])
+        elif opt in ( "-i", "--instr" ) :
+            instr = arg.upper()
+        elif opt in ( "-m", "--memory" ) :
+            memory = True
+        elif opt in ( "-s", "--summary" ) :
+            summary = True
+        elif opt in ( "-h", "--help" ) :
+            usage()
+    if len(args) != 1:
+        usage()
+
+    reader = TraceReader(args[0])
+    if summary:
+        s = summarise(reader)
+        print("# Instructions       : %10d" % s["instructions"])
+        print("# Memory reads       : %10d" % s["loads"])
+        print("# Memory writes      : %10d" % s["stores"])
+        print("# Most executed instructions")
+        for (name, n) in s["mnemonics"].most_common(10):
+            print("#   %-8s %10d" % (name, n))
+        print("# Most executed addresses")
+        for (pc, n) in s["pcs"].most_common(10):
+            print("#   %04X     %10d" % (pc, n))
+        for (kind, counts) in (("read", s["reads"]), ("written", s["writes"])):
+            if counts:
+                print("# Most %s addresses" % kind)
+                for (a, n) in counts.most_common(10):
+                    print("#   %04X     %10d" % (a, n))
+    else:
+        ## Mnemonics by instruction word and M flag, filled in as they are first seen
+        names = dict()
+        CPU = F100CPU(statistics=False)
+        for r in reader.records():
+            if r.kind != INSTR:
+                if memory:
+                    print(render(r))
+                continue
+            if pc_range != None and not (pc_range[0] <= r.PC <= pc_range[1]):
+                continue
+            if instr != None:
+                key = (r.IR, (r.CR >> 5) & 1)
+                if key not in names:
+                    names[key] = mnemonic(CPU, *key)
+                if names[key] != instr:
+                    continue
+            print(render(r))
@@ -237,13 +237,109 @@ class F100_Opcode :
 
         return (operand, operand_address, cycles)
 
+    def translate_operand(self, IR, pc, tr, noread=False, nopointerarith=False):
+        '''
+        Block translator equivalent of get_operand() for the instruction at address pc.
+
+        Returns a tuple of (lines, address, operand, words, reads, writes) where lines is
+        the list of source lines computing the effective address and operand, address and
+        operand are expressions for those (operand is None when noread=True), words is the
+        instruction length and reads/writes are the number of memory accesses made,
+        including the opcode fetch. Returns None if the operand cannot be computed from
+        inside a block.
+        '''
+        CPU = self.CPU
+        lines = []
+        reads = 1
+        writes = 0
+        if (IR.I==0 and IR.N==0) or (IR.I==1 and IR.P==0):
+            # Operand word must be in the same straight line run of memory as the opcode
+            if pc + 1 > tr.limit:
+                return None
+        if IR.I==0 and IR.N==0:
+            # Immediate data word is part of the translated block, so fold it in as a constant
+            words = 2
+            address = "0x%04X" % (pc + 1)
+            operand = None if noread else "0x%04X" % CPU.RAM[pc + 1]
+            reads += 0 if noread else 1
+        elif IR.I==0:
+            words = 1
+            address = "0x%04X" % IR.N
+            if IR.N > CPU.MEMTOP:
+                return None
+            operand = None if noread else "RAM[0x%04X]" % IR.N
+            reads += 0 if noread else 1
+        elif IR.P==0:
+            words = 2
+            W = CPU.RAM[pc + 1]
+            if W > CPU.MEMTOP:
+                return None
+            address = "0x%04X" % W
+            operand = None if noread else "RAM[0x%04X]" % W
+            reads += 1 if noread else 2
+        else:
+            words = 1
+            if IR.P > CPU.MEMTOP:
+                return None
+            if nopointerarith==False and IR.R==1:
+                lines.append("ea = RAM[0x%04X] + 1" % IR.P)
+            else:
+                lines.append("ea = RAM[0x%04X]" % IR.P)
+            lines.extend(tr.pointer_guard())
+            address = "ea"
+            reads += 1
+            operand = None
+            if noread==False:
+                ## On a range error record the accesses made so far in x for the block to
+                ## account for, as memory_read() does not count the failing read
+                lines.extend([ "a = ea & 0xFFFF",
+                               "if a > 0x%04X: x = (%d, %d); raise UserWarning(\"Memory out of range error for address 0x%%04X\" %% a )" % (CPU.MEMTOP, reads, writes),
+                               "opd = RAM[a]" ])
+                operand = "opd"
+                reads += 1
+            if nopointerarith==False:
+                lines.extend(self.translate_write(tr, "0x%04X" % IR.P, "ea - 1" if IR.R==3 else "ea", IR.P))
+                writes += 1
+        return (lines, address, operand, words, reads, writes)
+
+    def translate_write(self, tr, address, data, const_address=None):
+        '''
+        Return source lines equivalent to memory_write(address, data) inside a translated
+        block. Writes which hit translated or decoded code invalidate it and flag the
+        block to stop after the current instruction.
+        '''
+        if const_address == None:
+            return [ "a = (%s) & 0xFFFF" % address,
+                     "if a > 0x%04X: raise UserWarning(\"Memory out of range error for address 0x%%04X\" %% a )" % self.CPU.MEMTOP,
+                     "RAM[a] = (%s) & 0xFFFF" % data,
+                     "ws(a)",
+                     "if cm[a]: smc = inval(a)" ]
+        return [ "RAM[%s] = (%s) & 0xFFFF" % (address, data),
+                 "ws(%s)" % address,
+                 "if cm[%s]: smc = inval(%s)" % (address, address) ]
+
+    def translate(self, IR, pc, tr):
+        '''
+        Return the block translator version of the instruction at address pc as a tuple
+        of (lines, words, reads, writes) - see translate_operand(). Returns None for
+        instructions which must end a block and be left to execute() instead.
+        '''
+        return None
+
+
+    def handler(self, IR):
+        '''
+        Return the function which executes instruction IR. The CPU resolves these into a
+        flat dispatch table when it is built, so opcode classes which sub-dispatch on
+        other fields can return the final handler directly.
+        '''
+        return self.execute
 
     def execute (self):
         '''
         On entry the CPU instruction register is already populated and the PC is pointing
         to the next instruction or the first operand
         '''
-        self.execstats[self.disassemble(self.CPU.IR)] += 1
         pass
 
     def disassemble(self, IR=None):
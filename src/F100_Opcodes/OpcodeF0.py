@@ -30,10 +30,14 @@ class OpcodeF0(F100_Opcode) :
 
         super().__init__(self.opcode_fn, CPU=CPU )
         self.F = 0
+        ## Share a single execution count dictionary with the sub-classes, so that each
+        ## instruction is counted once by whichever one executes it
+        for o in (self.obit, self.ohalt, self.ojump, self.oshift):
+            o.execstats = self.execstats
 
     def disassemble(self, IR):
         result = ""
-        if IR.T == 1:
+        if IR.T != 0:
             result = self.ohalt.disassemble(IR)
         elif IR.S == 2:
             result = self.ojump.disassemble(IR)
@@ -43,12 +47,19 @@ class OpcodeF0(F100_Opcode) :
             result = self.oshift.disassemble(IR)
         return result
 
-    def execute(self):
-        # No real function here, just need to determine where to send the exec task
-        IR = self.CPU.IR
-        self.execstats[self.disassemble(IR)] += 1
+    def translate(self, IR, pc, tr):
+        # Only bit and shift operations are straight line code; halts, External
+        # Functions and jumps end the block
+        if IR.T != 0 or IR.S == 2:
+            return None
+        elif IR.S == 3:
+            return self.obit.translate(IR, pc, tr)
+        else:
+            return self.oshift.translate(IR, pc, tr)
 
-        if IR.T == 1:
+    def handler(self, IR):
+        # Dispatch straight to the sub-class handling this instruction
+        if IR.T != 0:
             execfn = self.ohalt.execute
         elif IR.S == 2:
             execfn = self.ojump.execute
@@ -56,4 +67,9 @@ class OpcodeF0(F100_Opcode) :
             execfn = self.obit.execute
         else:
             execfn = self.oshift.execute
-        return execfn()
+        return execfn
+
+    def execute(self):
+        # No real function here, just need to determine where to send the exec task.
+        # The sub-class execute() updates the shared execution counts.
+        return self.handler(self.CPU.IR)()
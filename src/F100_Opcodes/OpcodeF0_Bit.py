@@ -95,13 +95,39 @@ class OpcodeF0_Bit(F100_Opcode) :
         else:
             return "SET"
 
+    def translate(self, IR, pc, tr):
+        bitmask = 0x01 << IR.B
+        if IR.J == 3:
+            lines = [ tr.count(IR) ]
+            expr = "%%s & 0x%04X" % (~bitmask & 0xFFFF)
+        elif IR.J == 2:
+            lines = [ tr.count(IR) ]
+            expr = "%%s | 0x%04X" % bitmask
+        else:
+            return None
+
+        if IR.R == 3:
+            if pc + 1 > tr.limit:
+                return None
+            W = self.CPU.RAM[pc + 1]
+            if W > self.CPU.MEMTOP:
+                return None
+            lines.append("OR = %s" % (expr % ("RAM[0x%04X]" % W)))
+            lines.extend(self.translate_write(tr, "0x%04X" % W, "OR", W))
+            return (lines, 2, 3, 1)
+        elif IR.R == 1:
+            lines.append(tr.store_flags)
+            lines.append("CR.fromint(%s)" % (expr % "CR.toint()"))
+            lines.append(tr.load_flags)
+        else:
+            lines.append("ACC = %s" % (expr % "ACC"))
+        return (lines, 1, 1, 0)
+
     def execute(self):
         cycle_count = 0
 
         IR = self.CPU.IR
         bitmask = 0x01 << IR.B
-        IR.name = self.disassemble(self.CPU.IR)
-        self.execstats[IR.name] += 1
 
         if IR.J == 3: # CLR
             if IR.R == 3:
@@ -1,6 +1,6 @@
 '''
-HALT - Stop Processor Execution
-===============================
+HALT, EXT - Stop Processor Execution, External Function
+=======================================================
 
 This instruction stops the CPU and prevents the F100-L from executing any further instructions.
 
@@ -11,10 +11,24 @@ The least significant 10 bits of the Opcode are ignored by the processor but can
 programmer to provide a halt number. The assembler allows the HALT instruction to appear either
 with or without an operand and in the latter case the 10 LSBs will be encoded into the opcode.
 
+With T=2 or 3 the instruction is instead an External Function, whose least significant bit of T
+and the 10 LSBs form an 11 bit identifier. The F100-L waits while a Special Processing Unit (SPU)
+carries out the function, or if no unit responds it times out, sets the F (Fail) flag and
+continues. In the emulator the units are Python handlers registered with the CPU by function
+number, see F100Coprocessors.
+
+The External Functions of the emulator's standard multiply/divide unit also have their own
+mnemonics, listed in EXTERNAL_FUNCTIONS, which take no operand.
+
 ::
 
    HALT       Stop processor execution
    HALT ,D    Stop processor execution
+   EXT ,D     External Function D
+   MUL        ACC:OR = ACC * OR
+   UDIV       ACC = ACC / OR, OR = ACC % OR
+   MUL32      32 bit multiply on the user stack, as MUL32 in mathlib.asm
+   UDIV32     32 bit divide on the user stack, as UDIV32 in mathlib.asm
 
 **Instruction Encoding**
 
@@ -25,6 +39,8 @@ with or without an operand and in the latter case the 10 LSBs will be encoded in
 +----+--+----------------------------+----------+----------------------+
 |0000|01|    10'b<Halt Number>       | HALT     | TBC                  |
 +----+--+----------------------------+----------+----------------------+
+|0000|1x|    10'b<Function>          | EXT      | TBC                  |
++----+--+----------------------------+----------+----------------------+
 
 **Condition Register**
 
@@ -34,48 +50,78 @@ with or without an operand and in the latter case the 10 LSBs will be encoded in
 |\--|\--|\--|\--|\--|\--|\--|
 +---+---+---+---+---+---+---+
 
-  * The condition register is unaffected by this instruction
+  * The condition register is unaffected by HALT. External Functions set F if no unit responds,
+    and otherwise leave the flags to the unit.
 '''
 
 from .F100_Opcode import *
 
+## External Function identifiers of the standard multiply/divide unit
+EXTERNAL_FUNCTIONS = { "MUL":0x010, "UDIV":0x011, "MUL32":0x012, "UDIV32":0x013 }
+
 class OpcodeF0_Halt(F100_Opcode) :
     def __init__ (self, CPU=None):
-        super().__init__(opcode_fn = { "HALT":0 }, CPU=CPU )
+        opcode_fn = { "HALT":0, "EXT":0 }
+        opcode_fn.update( (name, 0) for name in EXTERNAL_FUNCTIONS )
+        super().__init__(opcode_fn = opcode_fn, CPU=CPU )
         self.F = 0
+        self.names = dict( (v, k) for (k, v) in EXTERNAL_FUNCTIONS.items() )
 
     def assemble(self, opcode_token, operands, symbol_table, suppress_errors=False):
         warnings = []
-        halt_number = 0
-        if len(operands) == 1:
+        if opcode_token in EXTERNAL_FUNCTIONS:
+            if len(operands) != 0:
+                raise UserWarning("Error: %s instruction takes no operand" % opcode_token)
+            function = EXTERNAL_FUNCTIONS[opcode_token]
+        elif opcode_token == "EXT":
+            if len(operands) != 1:
+                raise UserWarning("Error: EXT instruction requires an External Function number")
             (addr_mode, first_operand ) = self.get_address_mode(operands[0])
             if addr_mode != ADM_IMMEDIATE:
-                raise UserWarning("Error: HALT instruction supports only immediate addressing for specifying a halt number")
-            (halt_number, w ) = get_operand_value(first_operand, symbol_table, suppress_errors)
+                raise UserWarning("Error: EXT instruction supports only immediate addressing for specifying a function number")
+            (function, w ) = get_operand_value(first_operand, symbol_table, suppress_errors)
             if w != None:
                 warnings.append(w)
-            validate_operand(halt_number, 0, 0x03FF, 10)
-
-        self.N = halt_number & 0x3FF
-        self.T = 1
-
+            validate_operand(function, 0, 0x07FF, 11)
+        else:
+            halt_number = 0
+            if len(operands) == 1:
+                (addr_mode, first_operand ) = self.get_address_mode(operands[0])
+                if addr_mode != ADM_IMMEDIATE:
+                    raise UserWarning("Error: HALT instruction supports only immediate addressing for specifying a halt number")
+                (halt_number, w ) = get_operand_value(first_operand, symbol_table, suppress_errors)
+                if w != None:
+                    warnings.append(w)
+                validate_operand(halt_number, 0, 0x03FF, 10)
+
+            self.N = halt_number & 0x3FF
+            self.T = 1
+            return( self.bitassemble(), warnings)
+
+        self.N = function & 0x3FF
+        self.T = 2 | (function >> 10)
         return( self.bitassemble(), warnings)
 
     def disassemble(self, IR):
         if IR.T == 1:
             return "HALT"
         else:
-            return "EXT"
+            return self.names.get(IR.content & 0x07FF, "EXT")
 
     def execute (self):
         cycle_count = 0
-        self.CPU.IR.name = self.disassemble(self.CPU.IR)
-        self.execstats[self.CPU.IR.name] += 1
 
         if self.CPU.IR.T >1 :
-            raise UserException("External Function operation in F=0 class not yet implemented")
+            function = self.CPU.IR.content & 0x07FF
+            handler = self.CPU.coprocessors.get(function)
+            if handler == None:
+                # No unit responds, so the External Function times out and sets Fail
+                self.CPU.CR.F = 1
+            else:
+                cycle_count = handler(self.CPU, function) or 0
         else:
             halt_number = self.CPU.IR.content & 0x03FF
+            self.CPU.halt_number = halt_number
             raise F100HaltException("CPU Halted with halt number 0x%04X" % halt_number )
 
         return cycle_count
@@ -148,8 +148,6 @@ class OpcodeF0_Jump(F100_Opcode) :
         cycle_count = 0
         CPU = self.CPU
         IR = CPU.IR
-        IR.name = self.mnemonics[IR.J]
-        self.execstats[IR.name] += 1
 
         bitmask = 0x01 << IR.B
 
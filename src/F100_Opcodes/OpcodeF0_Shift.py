@@ -408,9 +408,12 @@ class OpcodeF0_Shift(F100_Opcode) :
         return( self.bitassemble(), warnings)
 
 
-    def disassemble(self, IR):
+    def disassemble(self, IR, M=None):
+        # Mnemonic depends on the M flag, taken from the CPU unless given
         mnemonic = ""
-        if self.CPU.CR.M == 0:
+        if M == None:
+            M = self.CPU.CR.M
+        if M == 0:
             if IR.S == 0 and IR.J <2:
                 mnemonic = "SRA"
             elif IR.S == 0 and IR.J == 2:
@@ -434,13 +437,77 @@ class OpcodeF0_Shift(F100_Opcode) :
                 mnemonic = "SLL.D"
         return mnemonic
 
+    def translate(self, IR, pc, tr):
+        ## Shift length depends on the M flag at run time, so generate both variants
+        ## and select between them inside the block
+        reads = 1
+        writes = 0
+        if IR.R == 3:
+            if pc + 1 > tr.limit:
+                return None
+            W = self.CPU.RAM[pc + 1]
+            if W > self.CPU.MEMTOP:
+                return None
+            reads += 2
+            writes += 1
+            words = 2
+        else:
+            words = 1
+
+        if IR.S == 0 and IR.J <2:
+            (shift, dshift) = (sra, d_sra)
+        elif IR.S == 0 and IR.J == 2:
+            (shift, dshift) = (srl, d_srl)
+        elif IR.S == 0 and IR.J == 3:
+            (shift, dshift) = (rotr, d_srl)
+        elif IR.S == 1 and IR.J != 3:
+            (shift, dshift) = (sll, d_sll)
+        else:
+            (shift, dshift) = (rotl, d_sll)
+
+        lines = [ tr.count(IR, shift=True),
+                  "if not M:" ]
+        if IR.R == 1:
+            lines.append("    " + tr.store_flags)
+            lines.append("    o = OR = CR.toint()")
+        elif IR.R == 3:
+            lines.append("    o = OR = RAM[0x%04X]" % W)
+        else:
+            lines.append("    o = OR = ACC")
+        if shift == sll:
+            lines.append("    r = %s(o, %d)[0]" % (tr.ref(shift), IR.B))
+        else:
+            lines.append("    r = %s(o, %d)" % (tr.ref(shift), IR.B))
+        lines.append("    S = r >> 15")
+        lines.append("    V = ((r ^ o) >> 15) & 1")
+        if IR.R == 1:
+            lines.append("    CR.fromint(r)")
+            lines.append("    " + tr.load_flags)
+        elif IR.R == 3:
+            lines.append("    OR = r")
+            lines.extend("    " + l for l in self.translate_write(tr, "0x%04X" % W, "OR", W))
+        else:
+            lines.append("    ACC = r")
+
+        lines.append("else:")
+        lines.append("    dc += %d" % self.CPU.timing.double_cycles(IR.content))
+        if IR.R == 3:
+            lines.append("    OR = RAM[0x%04X]" % W)
+        shift_dist = ( (IR.J << 4) | IR.B )  & 0x1F
+        lines.append("    t = %s(ACC, OR, %d)" % (tr.ref(dshift), shift_dist))
+        lines.append("    S = t[0] >> 15")
+        lines.append("    V = ((t[0] ^ ACC) >> 15) & 1")
+        lines.append("    ACC = t[0]")
+        lines.append("    OR = t[1]")
+        if IR.R == 3:
+            lines.extend("    " + l for l in self.translate_write(tr, "0x%04X" % W, "OR", W))
+        return (lines, words, reads, writes)
+
     def execute(self):
         cycle_count = 0
         CPU = self.CPU
         CR = self.CPU.CR
         IR = self.CPU.IR
-        IR.name = self.disassemble(self.CPU.IR)
-        self.execstats[IR.name] += 1
 
         if CR.M == 0 :
             # Single length shifts and rotates
@@ -454,8 +521,6 @@ class OpcodeF0_Shift(F100_Opcode) :
 
             if IR.S == 0 and IR.J <2:
                 result = sra(operand, IR.B)
-                CR.S = 1 if result & 0x8000 else 0
-                CR.V = 1 if (result & 0x8000) != (operand & 0x8000) else 0
             elif IR.S == 0 and IR.J == 2:
                 result = srl(operand, IR.B)
             elif IR.S == 0 and IR.J == 3:
@@ -466,8 +531,7 @@ class OpcodeF0_Shift(F100_Opcode) :
                 result = rotl(operand, IR.B)
 
             # Always computer S and V even when meaningless
-            CR.S = 1 if result & 0x8000 else 0
-            CR.V = 1 if (result & 0x8000) != (operand & 0x8000) else 0
+            CR.set_shift_flags(result, operand)
 
             if IR.R == 1:
                 CR.fromint(result)
@@ -478,7 +542,9 @@ class OpcodeF0_Shift(F100_Opcode) :
                 CPU.ACC = result
 
         else:
-            # Double length shifts use LSB of J field to extend shift number
+            # Double length shifts use LSB of J field to extend shift number, and take
+            # longer than the single length time accounted for when decoded
+            cycle_count = CPU.timing.double_extra[IR.content]
             shift_dist = ( (IR.J << 4) | IR.B )  & 0x1F
             # Double length shifts
             if ( IR.R==3):
@@ -490,8 +556,7 @@ class OpcodeF0_Shift(F100_Opcode) :
                 (result, result1) = d_srl(CPU.ACC, CPU.OR, shift_dist)
             else:
                 (result, result1, overflow) = d_sll(CPU.ACC, CPU.OR, shift_dist)
-            CR.S = 1 if result & 0x8000 else 0
-            CR.V = 1 if (result & 0x8000) != (CPU.ACC & 0x8000) else 0
+            CR.set_shift_flags(result, CPU.ACC)
 
             CPU.ACC = result
             CPU.OR = result1
@@ -78,9 +78,24 @@ class OpcodeF10(F100_Opcode) :
         super().__init__( opcode_fn = { "SUB":10}, CPU=CPU )
         self.F = 10
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = %s" % operand)
+        lines.append("r = (OR - ACC) & 0xFFFFFF")
+        lines.append("if M: r = (r + C - 1) & 0xFFFFFF")
+        lines.append("C = ((r >> 16) & 1) ^ 1")
+        lines.append("V = 1 if ((ACC ^ OR) & 0x8000) and ((r ^ OR) & 0x8000) else 0")
+        lines.append("ACC = r & 0xFFFF")
+        lines.append("Z = 0 if ACC else 1")
+        lines.append("S = ACC >> 15")
+        return (lines, words, reads, writes)
+
     def execute(self):
         cycle_count = 0
-        self.execstats[self.CPU.IR.name] += 1
 
         (self.CPU.OR, operand_address, cycle_count) = self.get_operand()
 
@@ -88,14 +103,7 @@ class OpcodeF10(F100_Opcode) :
         if (self.CPU.CR.M==1) :
             result = (result + self.CPU.CR.C - 1 ) & 0xFFFFFF
 
-        self.CPU.CR.C = 0 if (result & 0x010000) != 0 else 1
-        self.CPU.CR.Z = 1 if (result & 0xFFFF) == 0 else 0
-        self.CPU.CR.S = 1 if (result & 0x8000) != 0 else 0
-        
-        if ((self.CPU.ACC & 0x8000) != (self.CPU.OR & 0x8000)) and ((result & 0x8000) != (self.CPU.OR & 0x8000)):
-            self.CPU.CR.V = 1
-        else:
-            self.CPU.CR.V = 0
+        self.CPU.CR.set_sub_flags(self.CPU.ACC, self.CPU.OR, result)
         self.CPU.ACC = result & 0xFFFF
 
         return cycle_count
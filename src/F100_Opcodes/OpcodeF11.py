@@ -87,22 +87,30 @@ class OpcodeF11(F100_Opcode) :
         super().__init__( opcode_fn = { "CMP":11}, CPU=CPU)
         self.F = 11
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = %s" % operand)
+        lines.append("r = (OR - ACC) & 0xFFFFFF")
+        lines.append("if M: r = (r + C - 1) & 0xFFFFFF")
+        lines.append("C = ((r >> 16) & 1) ^ 1")
+        lines.append("Z = 0 if r & 0xFFFF else 1")
+        lines.append("S = (r >> 15) & 1")
+        lines.append("V = 1 if ((ACC ^ OR) & 0x8000) and ((r ^ OR) & 0x8000) else 0")
+        return (lines, words, reads, writes)
+
     def execute(self):
         cycle_count = 0
 
         CPU = self.CPU
-        self.execstats[self.CPU.IR.name] += 1
 
         (CPU.OR, operand_address, cycle_count) = self.get_operand()
         result = (CPU.OR - CPU.ACC) & 0xFFFFFF
         if (CPU.CR.M==1) :
             result = (result + CPU.CR.C - 1) & 0xFFFFFF
 
-        CPU.CR.C = 0 if (result & 0x010000) > 0 else 1
-        CPU.CR.Z = 1 if (result & 0xFFFF) == 0 else 0
-        CPU.CR.S = 1 if (result & 0x8000) != 0 else 0
-        if ((CPU.ACC & 0x8000) != (CPU.OR & 0x8000)) and ((result & 0x8000) != (CPU.OR & 0x8000)):
-            CPU.CR.V = 1
-        else:
-            CPU.CR.V = 0
+        CPU.CR.set_sub_flags(CPU.ACC, CPU.OR, result)
         return cycle_count
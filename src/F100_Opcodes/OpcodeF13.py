@@ -60,17 +60,27 @@ class OpcodeF13(F100_Opcode) :
         super().__init__( opcode_fn = { "NEQ":13}, CPU=CPU )
         self.F = 13
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = %s" % operand)
+        lines.append("ACC = ACC ^ OR")
+        lines.append("C = 0")
+        lines.append("Z = 0 if ACC else 1")
+        lines.append("S = ACC >> 15")
+        return (lines, words, reads, writes)
+
     def execute(self):
         cycle_count = 0
 
-        self.execstats[self.CPU.IR.name] += 1
 
         (self.CPU.OR, operand_address, cycle_count) = self.get_operand()
         result = self.CPU.ACC ^ self.CPU.OR
         self.CPU.ACC  = result
 
-        self.CPU.CR.C = 0
-        self.CPU.CR.Z = 1 if (result & 0xFFFF) == 0 else 0
-        self.CPU.CR.S = 1 if (result & 0x8000) != 0 else 0
+        self.CPU.CR.set_logic_flags(result, 0)
         cycle_count += 0
         return cycle_count
@@ -63,6 +63,19 @@ class OpcodeF4(F100_Opcode) :
         super().__init__( opcode_fn = { "STO":4}, CPU=CPU)
         self.F = 4
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr, noread=True)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = ACC")
+        lines.extend(self.translate_write(tr, address, "OR", None if address=="ea" else int(address, 0)))
+        lines.append("Z = 0 if ACC else 1")
+        lines.append("S = ACC >> 15")
+        lines.append("V = 0")
+        return (lines, words, reads, writes + 1)
+
     def execute(self):
         cycle_count = 0
 
@@ -70,11 +83,8 @@ class OpcodeF4(F100_Opcode) :
         IR = self.CPU.IR
         CR = self.CPU.CR
 
-        self.execstats[IR.name] += 1
         (operand, operand_address, cycle_count) = self.get_operand(noread=True)
         CPU.OR = CPU.ACC
         CPU.memory_write(operand_address, CPU.OR)
-        CPU.CR.Z = 1 if (CPU.ACC & 0xFFFF) == 0 else 0
-        CPU.CR.S = 1 if (CPU.ACC & 0x8000) != 0 else 0
-        CPU.CR.V = 0
+        CPU.CR.set_load_flags(CPU.ACC)
         return cycle_count
@@ -86,11 +86,27 @@ class OpcodeF5(F100_Opcode) :
         super().__init__( opcode_fn = { "ADS":5}, CPU=CPU)
         self.F = 5
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = %s" % operand)
+        lines.append("r = (OR + ACC) & 0x1FFFF")
+        lines.append("if M: r = (r + C) & 0x1FFFF")
+        lines.extend(self.translate_write(tr, address, "r", None if address=="ea" else int(address, 0)))
+        lines.append("V = 1 if not ((ACC ^ OR) & 0x8000) and ((r ^ ACC) & 0x8000) else 0")
+        lines.append("C = r >> 16")
+        lines.append("Z = 0 if r & 0xFFFF else 1")
+        lines.append("S = (r >> 15) & 1")
+        lines.append("OR = r")
+        return (lines, words, reads, writes + 1)
+
     def execute(self):
         cycle_count = 0
         CPU = self.CPU
 
-        self.execstats[self.disassemble(CPU.IR)] += 1
 
         (CPU.OR, operand_address, cycles) = self.get_operand()
         result = (CPU.OR + CPU.ACC) & 0x1FFFF
@@ -99,13 +115,7 @@ class OpcodeF5(F100_Opcode) :
 
         CPU.memory_write(operand_address, result)
 
-        if ((CPU.ACC & 0x8000) == (CPU.OR & 0x8000)) and ((result & 0x8000) != (CPU.ACC & 0x8000)):
-            CPU.CR.V = 1
-        else:
-            CPU.CR.V = 0
-        CPU.CR.C = 1 if (result & 0x010000) > 0 else 0
-        CPU.CR.Z = 1 if (result & 0xFFFF) == 0 else 0
-        CPU.CR.S = 1 if (result & 0x8000) != 0 else 0
+        CPU.CR.set_add_flags(CPU.ACC, CPU.OR, result)
         CPU.OR = result
         
         return cycle_count
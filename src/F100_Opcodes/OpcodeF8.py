@@ -62,15 +62,24 @@ class OpcodeF8(F100_Opcode) :
         super().__init__( opcode_fn = { "LDA":8}, CPU=CPU)
         self.F = 8
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = ACC = %s" % operand)
+        lines.append("Z = 0 if ACC else 1")
+        lines.append("S = ACC >> 15")
+        lines.append("V = 0")
+        return (lines, words, reads, writes)
+
     def execute(self):
         cycle_count = 0
         CPU = self.CPU
-        self.execstats[CPU.IR.name] += 1
 
         (CPU.OR, operand_address, cycle_count) = self.get_operand()
 
         CPU.ACC = CPU.OR
-        CPU.CR.Z = 1 if (CPU.ACC & 0xFFFF) == 0 else 0
-        CPU.CR.S = 1 if (CPU.ACC & 0x8000) != 0 else 0
-        CPU.CR.V = 0
+        CPU.CR.set_load_flags(CPU.ACC)
         return cycle_count
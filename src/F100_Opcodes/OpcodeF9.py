@@ -77,11 +77,26 @@ class OpcodeF9(F100_Opcode) :
         super().__init__( opcode_fn = { "ADD":9}, CPU=CPU)
         self.F = 9
 
+    def translate(self, IR, pc, tr):
+        code = self.translate_operand(IR, pc, tr)
+        if code == None:
+            return None
+        (lines, address, operand, words, reads, writes) = code
+        lines.append(tr.count(IR))
+        lines.append("OR = %s" % operand)
+        lines.append("r = (OR + ACC) & 0xFFFFFF")
+        lines.append("if M: r = (r + C) & 0xFFFFFF")
+        lines.append("V = 1 if not ((ACC ^ OR) & 0x8000) and ((r ^ ACC) & 0x8000) else 0")
+        lines.append("ACC = r & 0xFFFF")
+        lines.append("C = (r >> 16) & 1")
+        lines.append("Z = 0 if ACC else 1")
+        lines.append("S = ACC >> 15")
+        return (lines, words, reads, writes)
+
     def execute(self):
         cycle_count = 0
 
         CPU = self.CPU
-        self.execstats[CPU.IR.name] += 1
 
         (CPU.OR, operand_address, cycle_count) = self.get_operand()
 
@@ -89,15 +104,8 @@ class OpcodeF9(F100_Opcode) :
 
         if (CPU.CR.M==1) :
             result = (result + CPU.CR.C) & 0xFFFFFF
-        if ((CPU.ACC & 0x8000) == (CPU.OR & 0x8000)) and ((result & 0x8000) != (CPU.ACC & 0x8000)):
-            CPU.CR.V = 1
-        else:
-            CPU.CR.V = 0
 
+        CPU.CR.set_add_flags(CPU.ACC, CPU.OR, result)
         CPU.ACC = result & 0xFFFF
 
-        CPU.CR.C = 1 if (result & 0x010000) > 0 else 0
-        CPU.CR.Z = 1 if (result & 0xFFFF) == 0 else 0
-        CPU.CR.S = 1 if (result & 0x8000) != 0 else 0
-
         return cycle_count
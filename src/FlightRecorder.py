@@ -0,0 +1,94 @@
+## ============================================================================
+## FlightRecorder.py - Record of recent execution for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Flight Recorder
+---------------
+
+The CPU can keep a ring buffer of recent execution, which F100Emu prints when a run
+stops abnormally. F100CPU leaves it off unless given the number of entries to keep
+with F100CPU(flight_recorder=size), so the default run loop does no recording, while
+F100Emu turns it on with 64 entries unless given flight_recorder=0.
+
+single_step() appends the decoded instruction it is about to execute, the same tuple
+of instruction record, handler, cycles and address kept in the decode cache, so each
+instruction costs a single call to the append method of a bounded deque. This records
+the address and instruction word, as fetched so that the entries still show what was
+executed after self modifying code has overwritten it, but not the registers.
+
+Translated blocks (see BlockTranslator) do not record the instructions inside them.
+Instead block_step() appends one entry when each block exits, normally or on a fault,
+holding the block's start address, the PC it left at and the ACC, OR and condition
+register at that point, followed by the entry for the instruction which ends it.
+'''
+
+from InstructionReg import DECODE_TABLE
+from collections import deque
+import sys
+
+class FlightRecorder:
+    '''
+    Ring buffer of the last size entries. Each entry is either a decoded instruction as
+    kept in the CPU decode cache, or a tuple of the start address, exit PC, ACC, OR and
+    CR of a translated block.
+    '''
+    def __init__ (self, size=64):
+        self.size = size
+        self.log = deque(maxlen=size)
+        ## Bound method, so that the CPU can look it up once
+        self.record = self.log.append
+
+    def clear(self):
+        ## Clear in place as the CPU holds the bound record method
+        self.log.clear()
+
+    def entries(self):
+        '''
+        Return the recorded entries, oldest first, as tuples of (PC, IR, ACC, OR, CR,
+        start). For an instruction IR is its word and the registers and start are None.
+        For a block exit PC is where it left, start where it began and IR is None.
+        '''
+        result = []
+        for entry in self.log:
+            if isinstance(entry[0], int):
+                (start, PC, ACC, OR, CR) = entry
+                result.append((PC, None, ACC & 0xFFFF, OR & 0xFFFF, CR, start))
+            else:
+                result.append((entry[3], entry[0].content, None, None, None, None))
+        return result
+
+    def dump(self, file=sys.stdout):
+        '''
+        Print the recorded entries, oldest first, in the format of the emulator trace.
+        Registers are shown only at the exit of each translated block.
+        '''
+        entries = self.entries()
+        print("# Last %d entries recorded, oldest first" % len(entries), file=file)
+        print("# PC  :   OP :  ACC   OR : FMCSVZI : Instruction", file=file)
+        for (PC, IR, ACC, OR, CR, start) in entries:
+            if IR is None:
+                flags = tuple((CR >> i) & 1 for i in range(6, -1, -1))
+                print("%04X  : ---- : %04X %04X : %d%d%d%d%d%d%d : (end of block from %04X)" %
+                      ((PC, ACC, OR) + flags + (start,)), file=file)
+            else:
+                print("%04X  : %04X :           :         : %s" % (PC, IR, DECODE_TABLE[IR].name),
+                      file=file)
@@ -0,0 +1,201 @@
+## ============================================================================
+## InstructionProfiler.py - Per-address and per-routine execution profiles
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Instruction Profiler
+--------------------
+
+InstructionProfiler counts every instruction executed by its address, and follows
+CAL and RTN to time each subroutine call. Once attached with F100CPU.set_profiler()
+the CPU wraps each decoded instruction to count it, and translated blocks count
+their instructions inline, so profiling works with blocks enabled.
+
+Counts are aggregated using a SymbolMap (see F100Symbols) in two ways:
+
+* per label - the instructions executed between each label and the next, which
+  shows the hot loops
+* per routine - for each CAL target, the number of calls, the inclusive count of all
+  instructions executed from the call until the matching return, and the exclusive
+  count of those not within a further call. Recursive calls are only counted once
+  in the inclusive totals. Code outside any call is shown as the top level.
+
+Calls are matched to returns by the link stack pointer, so returns which skip frames
+or code which adjusts the link stack itself are still accounted for.
+'''
+
+import sys
+
+## Name used for instructions executed outside any call
+TOP_LEVEL = "(top level)"
+
+class InstructionProfiler:
+    '''
+    Count instructions per address in counts, and the calls, inclusive and exclusive
+    instruction counts of each call target in routines, a dictionary of target
+    address to [calls, inclusive, exclusive].
+    '''
+    def __init__ (self, words=0x10000):
+        self.counts = [0] * words
+        self.routines = dict()
+        ## Active calls as [target, instr_count at call, LSP after call, count in callees]
+        self.frames = []
+        ## Instructions executed in calls made from the top level
+        self.outer = 0
+        self.CPU = None
+
+    def attach(self, CPU):
+        self.CPU = CPU
+        CPU.set_profiler(self)
+
+    def detach(self):
+        if self.CPU != None:
+            self.CPU.set_profiler(None)
+
+    def clear(self):
+        self.counts[0:] = [0] * len(self.counts)
+        self.routines.clear()
+        del self.frames[:]
+        self.outer = 0
+
+    def wrap(self, pc, IR, handler):
+        '''
+        Return handler wrapped to count the instruction at pc, and for CAL and RTN to
+        track the call
+        '''
+        counts = self.counts
+        if IR.F == 2:
+            def execute():
+                counts[pc] += 1
+                cycles = handler()
+                self.call()
+                return cycles
+        elif IR.F == 3:
+            def execute():
+                counts[pc] += 1
+                cycles = handler()
+                self.ret()
+                return cycles
+        else:
+            def execute():
+                counts[pc] += 1
+                return handler()
+        return execute
+
+    def call(self):
+        CPU = self.CPU
+        target = CPU.PC
+        routine = self.routines.get(target)
+        if routine == None:
+            routine = self.routines[target] = [0, 0, 0]
+        routine[0] += 1
+        self.frames.append([target, CPU.instr_count, CPU.RAM[0], 0])
+
+    def ret(self):
+        lsp = self.CPU.RAM[0]
+        frames = self.frames
+        while frames and frames[-1][2] > lsp:
+            self.outer += end_call(self.routines, frames, frames.pop(), self.CPU.instr_count)
+
+    def results(self):
+        '''
+        Return a list of (target, calls, inclusive, exclusive) for each routine, with
+        the top level as target None. Calls which have not returned are counted up to
+        the current instruction.
+        '''
+        routines = dict( (t, r[:]) for (t, r) in self.routines.items() )
+        frames = [ f[:] for f in self.frames ]
+        outer = self.outer
+        while frames:
+            outer += end_call(routines, frames, frames.pop(), self.CPU.instr_count)
+        total = sum(self.counts)
+        return [ (None, 0, total, total - outer) ] + [ (t, r[0], r[1], r[2]) for (t, r) in routines.items() ]
+
+    def labels(self, symbols):
+        '''
+        Return a list of (address, count) giving the instructions executed from each
+        label up to the next, plus any executed below the first label at address None
+        '''
+        totals = dict()
+        for (pc, n) in enumerate(self.counts):
+            if n:
+                (name, offset) = symbols.locate(pc)
+                address = None if name == None else pc - offset
+                totals[address] = totals.get(address, 0) + n
+        return list(totals.items())
+
+    def report(self, file=sys.stdout, symbols=None, top=20):
+        '''
+        Print the busiest routines by inclusive count, then the busiest labels, or
+        without symbols the busiest addresses, by exclusive count
+        '''
+        def name(address):
+            if address == None:
+                return TOP_LEVEL
+            if symbols == None:
+                return "%04X" % address
+            return symbols.describe(address) or "%04X" % address
+        routines = self.results()
+        total = routines[0][2]
+        share = lambda n : 100.0 * n / total if total else 0.0
+        print("# -------------------------------------------------------------------------------------------", file=file)
+        print("# Routine Profile - %d instructions" % total, file=file)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+        print("# Routine                         Calls     Inclusive          Exclusive", file=file)
+        print("# ---------------------------+----------+-------------------+-----------------------------------", file=file)
+        for (address, calls, inclusive, exclusive) in sorted(routines, key=lambda r : -r[2])[:top]:
+            print("# %-26s %10d %10d %6.2f%% %10d %6.2f%%" % (name(address)[:26], calls, inclusive, share(inclusive),
+                                                             exclusive, share(exclusive)), file=file)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+        if symbols != None:
+            print("# Label                                     Exclusive", file=file)
+            rows = self.labels(symbols)
+        else:
+            print("# Address                                   Exclusive", file=file)
+            rows = [ (pc, n) for (pc, n) in enumerate(self.counts) if n ]
+        print("# ---------------------------+-------------------------------------------------------------------", file=file)
+        for (address, n) in sorted(rows, key=lambda r : -r[1])[:top]:
+            if address == None:
+                label = "(before first label)"
+            elif symbols == None:
+                label = "%04X" % address
+            else:
+                label = "%04X %s" % (address, symbols.describe(address))
+            print("# %-26s            %10d %6.2f%%" % (label[:26], n, share(n)), file=file)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+
+
+def end_call(routines, frames, frame, now):
+    '''
+    Account for a call which has just returned, given the remaining active frames.
+    Returns the length of the call if it was made from the top level, otherwise adds
+    it to the callee count of the caller and returns 0.
+    '''
+    (target, start, lsp, callees) = frame
+    n = now - start
+    routine = routines[target]
+    routine[2] += n - callees
+    if not any(f[0] == target for f in frames):
+        routine[1] += n
+    if frames:
+        frames[-1][3] += n
+        return 0
+    return n
@@ -31,30 +31,61 @@ The bit fields are defined as follows
 
 Where a don't care (x) bit is presented in the tables, the assembler will consistently use a '0'. The
 emulator will ignore this field during decoding.
+
+Decode Table
+------------
+
+Since there are only 65536 possible instruction words, each one need only be decoded once. DECODE_TABLE
+maps every word to an immutable DecodedInstruction record with the same fields as the InstructionReg,
+decoding a word the first time it is looked up and keeping the record for later, so decoding an
+instruction is a single table lookup. The emulator uses these records directly as the contents of the
+instruction register.
 '''
 
 from F100_Opcodes import F100_Opcode
+from collections import namedtuple
 import re
 
+DecodedInstruction = namedtuple("DecodedInstruction", "content F I T R S J B P N name")
+
+def decode(word):
+    '''
+    Return the DecodedInstruction record for instruction word
+    '''
+    F = (word>>12)& 0x000F
+    return DecodedInstruction(word, F,
+                              (word>>11)& 0x0001,
+                              (word>>10)& 0x0003,
+                              (word>> 8)& 0x0003,
+                              (word>> 6)& 0x0003,
+                              (word>> 4)& 0x0003,
+                              word      & 0x000F,
+                              word      & 0x00FF,
+                              word      & 0x07FF,
+                              F100_Opcode.mnemonic[F] )
+
+class DecodeTable(dict):
+    '''
+    Dictionary of DecodedInstruction records by instruction word, filled in on first use
+    '''
+    def __missing__(self, word):
+        if not 0 <= word <= 0xFFFF:
+            raise IndexError("Instruction word 0x%X out of range" % word)
+        IR = self[word] = decode(word)
+        return IR
+
+DECODE_TABLE = DecodeTable()
+
 class InstructionReg:
-    def __init__ (self ):
-        self.update(0)
+    def __init__ (self, new_value=0):
+        self.update(new_value)
 
     def reset(self):
         self.update(0)
 
     def update(self, new_value):
-        self.content = new_value
-        self.F = (self.content>>12)& 0x000F
-        self.I = (self.content>>11)& 0x0001
-        self.T = (self.content>>10)& 0x0003
-        self.R = (self.content>> 8)& 0x0003
-        self.S = (self.content>> 6)& 0x0003
-        self.J = (self.content>> 4)& 0x0003
-        self.B = self.content      & 0x000F
-        self.P = self.content      & 0x00FF
-        self.N = self.content      & 0x07FF
-        self.name = F100_Opcode.mnemonic[self.F]
+        ( self.content, self.F, self.I, self.T, self.R, self.S, self.J,
+          self.B, self.P, self.N, self.name ) = DECODE_TABLE[new_value & 0xFFFF]
 
     
     def tostring(self):
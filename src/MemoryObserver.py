@@ -0,0 +1,89 @@
+## ============================================================================
+## MemoryObserver.py - Memory access observers for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Memory Observers
+----------------
+
+With no observers attached the CPU uses plain memory read and write functions which
+only count and range check each access. Attaching an observer with
+F100CPU.add_observer() installs wrapped versions of those functions which also pass
+every traced access to each observer in turn, and removing the last one restores the
+plain functions again. Accesses made with notrace set, such as those for the trace
+listing itself or for loading memory, are never passed on.
+
+Observers also force block_step() back to single stepping, since translated blocks
+access memory directly.
+
+An observer is any object with read(address, data) and write(address, data) methods.
+Each read is reported after the data has been fetched and each write before memory is
+updated.
+'''
+
+class MemoryObserver:
+    '''
+    Base class for memory observers, ignoring all accesses
+    '''
+    def read(self, address, data):
+        pass
+
+    def write(self, address, data):
+        pass
+
+
+class MemoryTracer(MemoryObserver):
+    '''
+    Print every memory access to stdout, as used by the emulator -m/--memtraceon switch
+    '''
+    def read(self, address, data):
+        print ("LOAD  : addr=0x%04X (%6d) data=0x%04X (%6d)"%(address, address, data, data));
+
+    def write(self, address, data):
+        print ("STORE : addr=0x%04X (%6d) data=0x%04X (%6d)"%(address, address, data, data));
+
+
+class MemoryWatchpoint(MemoryObserver):
+    '''
+    Record reads and/or writes to any of a set of addresses. Each hit is appended to
+    hits as a tuple of ("LOAD"|"STORE", address, data) and, if given, passed to callback
+    with the same three arguments. The callback may raise an exception to stop the CPU,
+    otherwise a run can be stopped with an until function testing hits.
+    '''
+    def __init__ (self, addresses, reads=True, writes=True, callback=None):
+        self.addresses = set( a & 0xFFFF for a in addresses )
+        self.reads = reads
+        self.writes = writes
+        self.callback = callback
+        self.hits = []
+
+    def hit(self, kind, address, data):
+        self.hits.append( (kind, address, data) )
+        if self.callback != None:
+            self.callback(kind, address, data)
+
+    def read(self, address, data):
+        if self.reads and address in self.addresses:
+            self.hit("LOAD", address, data)
+
+    def write(self, address, data):
+        if self.writes and address in self.addresses:
+            self.hit("STORE", address, data)
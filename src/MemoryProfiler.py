@@ -0,0 +1,211 @@
+## ============================================================================
+## MemoryProfiler.py - Memory access heatmaps for the F100-L emulator
+##
+## COPYRIGHT 2016 Richard Evans, Ed Spittles
+##
+## This file is part of f100l - an set of utilities for programming and
+## emulation of the Ferranti F100-L CPU and peripheral components.
+##
+## f100l is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## f100l is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## See  <http://www.gnu.org/licenses/> for a copy of the GNU Lesser General
+## Public License
+##
+## ============================================================================
+'''
+Memory Profiler
+---------------
+
+MemoryProfiler is a memory observer (see MemoryObserver) which counts the reads,
+writes and read-modify-writes of every address, or of every bucket of a fixed number
+of words, in preallocated arrays. A read-modify-write is a write to a location which
+the same instruction has already read, as done by ADS, SBS, ICZ, the bit and shift
+instructions on memory, pointer increment and decrement, and CAL and RTN updating
+the link stack pointer. These writes are counted in both the writes and the
+modifies columns. All accesses are counted, including instruction fetches.
+
+The counts can be written out as a text report with an ASCII map, as CSV or as a
+NumPy .npy file, and when given a SymbolMap (see F100Symbols) the report and CSV name
+each address from the assembler symbols.
+
+Like any observer the profiler makes the CPU single step, so a profiled run is slower
+than one using translated blocks.
+'''
+
+from MemoryObserver import MemoryObserver
+from array import array
+import struct
+import sys
+import math
+
+## Addresses below this can be reached by the direct addressing modes
+DIRECT_LIMIT = 0x800
+
+## Characters used for the ASCII map, from no accesses up to the busiest bucket
+SHADES = " .:-=+*#%@"
+
+class MemoryProfiler(MemoryObserver):
+    '''
+    Count memory accesses per bucket of bucket words over a memory of words words.
+    Bucket i covers addresses i*bucket to (i+1)*bucket-1, and its counts are held in
+    reads[i], writes[i] and modifies[i].
+    '''
+    def __init__ (self, bucket=1, words=0x10000):
+        if bucket < 1:
+            raise UserWarning("Memory profiler bucket size must be at least one word")
+        self.bucket = bucket
+        self.size = (words + bucket - 1) // bucket
+        self.reads = array('Q', bytes(8 * self.size))
+        self.writes = array('Q', bytes(8 * self.size))
+        self.modifies = array('Q', bytes(8 * self.size))
+        self.CPU = None
+        self.instr = -1
+        self.current = set()
+
+    def attach(self, CPU):
+        self.CPU = CPU
+        CPU.add_observer(self)
+
+    def detach(self):
+        if self.CPU != None:
+            self.CPU.remove_observer(self)
+            self.CPU = None
+
+    def clear(self):
+        for counts in (self.reads, self.writes, self.modifies):
+            counts[0:] = array('Q', bytes(8 * self.size))
+
+    def read(self, address, data):
+        ## Addresses read by the current instruction, to spot read-modify-writes
+        n = self.CPU.instr_count
+        if n != self.instr:
+            self.instr = n
+            self.current.clear()
+        self.current.add(address)
+        self.reads[address // self.bucket] += 1
+
+    def write(self, address, data):
+        b = address // self.bucket
+        self.writes[b] += 1
+        if self.CPU.instr_count == self.instr and address in self.current:
+            self.modifies[b] += 1
+
+    def rows(self):
+        '''
+        Return a list of (address, reads, writes, modifies) for every bucket which has
+        been accessed, in address order, where address is the first in the bucket
+        '''
+        reads = self.reads
+        writes = self.writes
+        return [ (i * self.bucket, reads[i], writes[i], self.modifies[i])
+                 for i in range(0, self.size) if reads[i] or writes[i] ]
+
+    def name(self, address, symbols):
+        '''
+        Return the names of the symbols in the bucket starting at address, or failing
+        that the nearest label below it plus an offset
+        '''
+        if symbols == None:
+            return ""
+        names = [ n for a in range(address, address + self.bucket) for n in symbols.names(a) ]
+        if names:
+            return "/".join(names)
+        return symbols.describe(address)
+
+    def write_file(self, filename, symbols=None):
+        '''
+        Write the profile to filename as CSV if it ends in .csv, as NumPy if it ends in
+        .npy and otherwise as a text report followed by an ASCII map
+        '''
+        if filename.endswith(".npy"):
+            self.write_npy(filename)
+        else:
+            with open(filename, "w") as f:
+                if filename.endswith(".csv"):
+                    self.write_csv(f, symbols)
+                else:
+                    self.report(f, symbols)
+                    self.ascii_map(f, symbols)
+
+    def write_csv(self, file, symbols=None):
+        file.write("address,symbol,reads,writes,modifies,total\n")
+        for (address, r, w, m) in self.rows():
+            file.write("0x%04X,%s,%d,%d,%d,%d\n" % (address, self.name(address, symbols), r, w, m, r + w))
+
+    def write_npy(self, filename):
+        '''
+        Write all buckets as a NumPy array of shape (buckets, 3) and type uint64, with
+        columns reads, writes and modifies
+        '''
+        data = array('Q')
+        for i in range(0, self.size):
+            data.extend((self.reads[i], self.writes[i], self.modifies[i]))
+        if sys.byteorder == "big":
+            data.byteswap()
+        header = "{'descr': '<u8', 'fortran_order': False, 'shape': (%d, 3), }" % self.size
+        ## Pad so the data starts on a 64 byte boundary, as NumPy does
+        header += " " * (63 - (10 + len(header)) % 64) + "\n"
+        with open(filename, "wb") as f:
+            f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+            data.tofile(f)
+
+    def report(self, file=sys.stdout, symbols=None, top=20):
+        '''
+        Print the total accesses, the share of them to the directly addressable low 2K
+        words, and the top busiest buckets
+        '''
+        rows = self.rows()
+        total = sum(r + w for (a, r, w, m) in rows)
+        direct = sum(r + w for (a, r, w, m) in rows if a < DIRECT_LIMIT)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+        print("# Memory Access Profile (%d word bucket%s)" % (self.bucket, "" if self.bucket == 1 else "s"), file=file)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+        print("#   Memory accesses         : %10d" % total, file=file)
+        print("#   Reads                   : %10d" % sum(r[1] for r in rows), file=file)
+        print("#   Writes                  : %10d" % sum(r[2] for r in rows), file=file)
+        print("#   Read-modify-writes      : %10d" % sum(r[3] for r in rows), file=file)
+        print("#   Below 0x%04X            : %10d (%5.1f%%)" % (DIRECT_LIMIT, direct, 100.0 * direct / total if total else 0.0), file=file)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+        print("# Address     Reads     Writes   Modifies    Share  Symbol", file=file)
+        print("# -------+----------+----------+----------+--------+-------------------------------------------", file=file)
+        for (address, r, w, m) in sorted(rows, key=lambda row : (-(row[1] + row[2]), row[0]))[:top]:
+            print("# %04X   %10d %10d %10d %7.2f%%  %s" % (address, r, w, m, 100.0 * (r + w) / total,
+                                                         self.name(address, symbols)[:44]), file=file)
+        print("# -------------------------------------------------------------------------------------------", file=file)
+
+    def ascii_map(self, file=sys.stdout, symbols=None, width=64):
+        '''
+        Print a map of width buckets per line, shading each by its total accesses on a
+        log scale relative to the busiest bucket. Lines with no accesses are skipped,
+        and each line is followed by the names of the symbols within it.
+        '''
+        totals = [ self.reads[i] + self.writes[i] for i in range(0, self.size) ]
+        peak = max(totals) if totals else 0
+        scale = (len(SHADES) - 2) / math.log(peak + 1) if peak > 1 else 0
+        print("# Accesses per %d word%s, log scale '%s' up to %d" % (self.bucket, "" if self.bucket == 1 else "s",
+                                                               SHADES[1:], peak), file=file)
+        skipped = False
+        for start in range(0, self.size, width):
+            line = totals[start:start+width]
+            if not any(line):
+                skipped = True
+                continue
+            if skipped:
+                print("        ...", file=file)
+                skipped = False
+            shades = "".join( SHADES[0] if n == 0 else SHADES[1 + int(scale * math.log(n + 1))] for n in line )
+            names = ""
+            if symbols != None:
+                lo = start * self.bucket
+                hi = min(self.size, start + width) * self.bucket
+                found = [ n for a in range(lo, hi) for n in symbols.names(a) ]
+                names = " ".join(found[:8]) + (" ..." if len(found) > 8 else "")
+            print("%04X : |%-*s| %s" % (start * self.bucket, width, shades, names), file=file)
@@ -0,0 +1,13 @@
+; Regression test for pointer indirect operands outside memory. The pointer at PTR
+; holds an address above the top of the 32K word RAM, so the load must stop the
+; emulator with a memory out of range error whether or not blocks are translated.
+
+        .equ  PTR     0x0010
+
+        .org  PTR
+        .word 0x9000
+
+        .org  0x800
+        LDA   ,0x1234
+        LDA   /PTR              ; read through an out of range pointer
+        HALT  ,0x123            ; never reached